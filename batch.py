@@ -0,0 +1,101 @@
+# batch.py
+# Resolução em lote: muitos datasets ClassTT (ficheiros ou diretórios) num pool
+# de processos, cada um com o seu orçamento de tempo. À medida que cada tarefa
+# termina é escrita uma linha JSON com a solução, o score, o nível vencedor e
+# as estatísticas da pesquisa, em vez das grelhas de show_by_class/show_by_teacher.
+#
+# Uso: python batch.py datasets/ outro.txt --seconds 30 --workers 4 > resultados.jsonl
+
+import argparse, contextlib, json, multiprocessing as mp, os, pathlib, sys, time
+
+from dataset import content_hash, load_dataset
+from main import SLOTS, CompiledModel, score_solution, try_solve_with_budget
+from solcache import SolutionCache
+
+
+def dataset_paths(args, pattern="*.txt"):
+    """Caminhos dados -> lista de ficheiros (os diretórios expandem para os seus `pattern`, por ordem)."""
+    paths = []
+    for arg in args:
+        p = pathlib.Path(arg)
+        paths.extend(sorted(p.glob(pattern)) if p.is_dir() else [p])
+    return [str(p) for p in paths]
+
+def solve_file(job):
+    """
+    Uma tarefa do lote: carrega o dataset, corre a cascata de níveis
+    (try_solve_with_budget) com `seconds` de orçamento e devolve o registo JSON.
+    Os prints do solver vão para `log` (None: descartados), para não misturar
+    com as linhas JSON. Um erro no dataset fica no registo em vez de parar o lote.
+    cache: SolutionCache partilhada pelas tarefas (None: sem cache).
+    """
+    path, seconds, backend, polish, log, cache = job
+    start = time.monotonic()
+    record = {"path": path}
+    try:
+        with open(log or os.devnull, "a", encoding="utf-8") as out, contextlib.redirect_stdout(out):
+            record["hash"] = content_hash(path)
+            data = load_dataset(path)
+            report = {}
+            sol, by_class, soft_max3 = try_solve_with_budget(data, total_seconds=seconds, backend=backend,
+                                                             polish=polish, compiled=CompiledModel(data),
+                                                             report=report, cache=cache)
+        record["found"] = sol is not None
+        if sol is not None:
+            record.update(score=score_solution(sol, by_class, data, soft_max3=soft_max3),
+                          layer=report["layer"], desc=report["desc"], soft_max3=soft_max3,
+                          stats=report["stats"], solution=sol, by_class=by_class)
+    except Exception as e:
+        record.update(found=False, error=f"{type(e).__name__}: {e}")
+    record["seconds"] = round(time.monotonic() - start, 3)
+    return record
+
+def solve_batch(paths, seconds=60.0, workers=None, backend="bitset", polish="enum", log_dir=None,
+                cache=None):
+    """
+    Resolve `paths` num pool de `workers` processos (por omissão, um por CPU),
+    cada tarefa com `seconds` de orçamento. Gera os registos pela ordem em que
+    terminam. log_dir: se dado, guarda os prints do solver em <log_dir>/<nome>.log.
+    """
+    if log_dir:
+        pathlib.Path(log_dir).mkdir(parents=True, exist_ok=True)
+    jobs = [(p, seconds, backend, polish,
+             str(pathlib.Path(log_dir) / f"{pathlib.Path(p).stem}.log") if log_dir else None, cache)
+            for p in paths]
+    workers = min(workers or mp.cpu_count(), len(jobs))
+    if workers <= 1:
+        yield from map(solve_file, jobs)
+        return
+    # maxtasksperchild=1: cada dataset num processo novo, sem memória acumulada entre tarefas
+    with mp.Pool(workers, maxtasksperchild=1) as pool:
+        yield from pool.imap_unordered(solve_file, jobs)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Resolve vários datasets ClassTT e escreve uma linha JSON por dataset.")
+    ap.add_argument("paths", nargs="+", help="ficheiros ClassTT ou diretórios (com *.txt)")
+    ap.add_argument("--seconds", type=float, default=60.0, help="orçamento por dataset (s)")
+    ap.add_argument("--workers", type=int, default=None, help="processos (por omissão, um por CPU)")
+    ap.add_argument("--backend", choices=("bitset", "constraint"), default="bitset",
+                    help="\"constraint\" ignora o var_order/val_order dos níveis")
+    ap.add_argument("--polish", choices=("enum", "local", "bnb"), default="enum")
+    ap.add_argument("--out", default="-", help="ficheiro JSONL de saída (\"-\": stdout)")
+    ap.add_argument("--log-dir", default=None, help="guardar aqui os prints do solver, um .log por dataset")
+    ap.add_argument("--no-cache", action="store_true", help="não usar nem gravar a cache de soluções")
+    args = ap.parse_args(argv)
+
+    paths = dataset_paths(args.paths)
+    if not paths:
+        ap.error("nenhum dataset encontrado")
+    out = sys.stdout if args.out == "-" else open(args.out, "a", encoding="utf-8")
+    try:
+        cache = None if args.no_cache else SolutionCache(slots=SLOTS)
+        for record in solve_batch(paths, args.seconds, args.workers, args.backend, args.polish, args.log_dir,
+                                  cache):
+            out.write(json.dumps(record, ensure_ascii=False, default=list) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == "__main__":
+    main()
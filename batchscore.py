@@ -0,0 +1,85 @@
+# batchscore.py
+# Score de muitos horários de uma vez com NumPy: cada linha de uma matriz
+# (n_soluções × n_aulas) tem o slot de cada aula. Os quatro termos de
+# score_solution (main.py) são calculados para o lote inteiro com operações
+# sobre arrays, a partir de índices pré-calculados aula -> turma, aula -> aula
+# irmã da mesma UC e slot -> dia. Dá exatamente o mesmo score que score_solution.
+
+import numpy as np  # pyright: ignore[reportMissingImports]
+
+
+class BatchScorer:
+    """
+    by_class:  turma -> nomes das aulas (como devolvido por build_problem).
+    data:      dataset de load_dataset (para a lista de UCs).
+    slot_day:  função slot -> dia; slots: universo de slots.
+    As colunas da matriz seguem self.names (UC_1, UC_2 por ordem de UC).
+    """
+
+    def __init__(self, by_class, data, slot_day, slots):
+        self.names = [f"{uc}_{i}" for uc in data["UCs"] for i in (1, 2)]
+        col = {name: j for j, name in enumerate(self.names)}
+
+        # slot -> índice do dia
+        days = {}
+        self.slot_day = np.zeros(max(slots) + 1, dtype=np.int64)
+        for s in slots:
+            self.slot_day[s] = days.setdefault(slot_day(s), len(days))
+        self.n_days = len(days)
+
+        # aula -> aula irmã: colunas das _1 e das _2 de cada UC
+        self.first = np.arange(0, len(self.names), 2)
+        self.second = self.first + 1
+
+        # aula -> turma (só as aulas que estão em by_class contam nos termos por turma)
+        members = [[col[v] for v in tvars] for tvars in by_class.values()]
+        self.n_classes = len(members)
+        self.cols = np.array([j for m in members for j in m], dtype=np.int64)
+        self.lesson_class = np.array([c for c, m in enumerate(members) for _ in m], dtype=np.int64)
+        # turma -> colunas, com enchimento (-1) até à maior turma, para ordenar por linha
+        width = max((len(m) for m in members), default=0)
+        self.class_cols = np.full((self.n_classes, width), -1, dtype=np.int64)
+        for c, m in enumerate(members):
+            self.class_cols[c, :len(m)] = m
+
+    def encode(self, sols):
+        """Lista de soluções {aula: (slot, sala, modo)} -> matriz de slots."""
+        return np.array([[sol[v][0] for v in self.names] for sol in sols], dtype=np.int64)
+
+    def score(self, slots, soft_max3=True):
+        """Score de cada linha de `slots` (n_soluções × n_aulas); devolve um array de ints."""
+        slots = np.asarray(slots, dtype=np.int64)
+        n = slots.shape[0]
+        day = self.slot_day[slots]
+
+        # 1) Aulas da mesma UC em dias distintos
+        score = (day[:, self.first] != day[:, self.second]).sum(axis=1)
+
+        # 2) Aulas consecutivas no mesmo dia (por turma): slots ordenados por turma,
+        #    pares vizinhos com diferença 1 e o mesmo dia
+        if self.class_cols.size:
+            # o enchimento fica com valores negativos distintos e afastados, que nunca fazem par
+            pad = -10 * (np.arange(self.class_cols.shape[1]) + 1)
+            padded = np.where(self.class_cols >= 0, slots[:, self.class_cols.clip(0)], pad)
+            padded.sort(axis=2)
+            a, b = padded[:, :, :-1], padded[:, :, 1:]
+            same_day = self.slot_day[a.clip(0)] == self.slot_day[b.clip(0)]
+            score = score + ((b == a + 1) & (a > 0) & same_day).sum(axis=(1, 2))
+
+        # 3) e 4) contagens por (solução, turma, dia)
+        idx = (np.arange(n)[:, None] * self.n_classes + self.lesson_class) * self.n_days + day[:, self.cols]
+        counts = np.bincount(idx.ravel(), minlength=n * self.n_classes * self.n_days)
+        counts = counts.reshape(n, self.n_classes, self.n_days)
+
+        # 3) Penalizar >4 dias ativos por turma
+        days_used = (counts > 0).sum(axis=2)
+        score = score - 2 * np.maximum(0, days_used - 4).sum(axis=1)
+
+        # 4) Se “max3 por dia” for soft, penaliza excesso
+        if soft_max3:
+            score = score - np.maximum(0, counts - 3).sum(axis=(1, 2))
+        return score
+
+    def score_solutions(self, sols, soft_max3=True):
+        """Atalho: score de uma lista de soluções em dict."""
+        return self.score(self.encode(sols), soft_max3=soft_max3).tolist()
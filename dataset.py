@@ -0,0 +1,134 @@
+# dataset.py
+# Leitura dos ficheiros ClassTT (#head, #cc, #olw, #dsd, #tr, #rr, #oc) numa só
+# passagem linear: tokenize percorre as linhas sem ler o ficheiro inteiro para
+# memória e parse_dataset constrói os mapas à medida. O resultado de
+# load_dataset fica numa cache em disco (marshal), indexada pelo hash do
+# conteúdo, para que execuções repetidas sobre o mesmo ficheiro não voltem a
+# fazer o parse.
+
+from collections import defaultdict
+import hashlib, marshal, os, pathlib
+
+SECTIONS = ("head", "cc", "olw", "dsd", "tr", "rr", "oc")
+CACHE_DIR = pathlib.Path(os.environ.get("CLASSTT_CACHE", pathlib.Path.home() / ".cache" / "classtt"))
+CACHE_VERSION = 1   # mudar quando o formato de load_dataset mudar
+
+
+# ---- Tokenizer ----
+def tokenize(lines):
+    """
+    (secção, linha) por cada linha de dados, numa só passagem.
+    Uma linha "#tag ..." muda de secção (tags desconhecidas são ignoradas até à
+    secção seguinte); "#" seguido de espaço é comentário; linhas vazias saltam-se.
+    """
+    tag = None
+    for ln in lines:
+        ln = ln.strip()
+        if not ln:
+            continue
+        if ln[0] == "#":
+            word = ln[1:].split(None, 1)
+            if word and not ln[1].isspace():
+                tag = word[0] if word[0] in SECTIONS else None
+            continue
+        if tag is not None:
+            yield tag, ln
+
+def read_sections(path):
+    """secção -> lista de linhas (não vazias, sem espaços nas pontas)."""
+    sections = {tag: [] for tag in SECTIONS}
+    with open(path, encoding="utf-8") as f:
+        for tag, ln in tokenize(f):
+            sections[tag].append(ln)
+    return sections
+
+
+# ---- Parse ----
+def parse_dataset(lines):
+    """Linhas de um ficheiro ClassTT -> dataset (ver load_dataset)."""
+    class_to_ucs = {}
+    teacher_to_ucs = {}
+    teacher_unavail = {}
+    uc_room_required = {}
+    uc_online_idx = defaultdict(set)
+
+    for tag, ln in tokenize(lines):
+        parts = ln.split()
+        if tag == "cc":       # classe -> UCs
+            class_to_ucs[parts[0]] = parts[1:]
+        elif tag == "dsd":    # docente -> UCs
+            teacher_to_ucs[parts[0]] = parts[1:]
+        elif tag == "tr":     # indisponibilidades por docente (slots)
+            teacher_unavail[parts[0]] = set(map(int, parts[1:]))
+        elif tag == "rr":     # restrição de sala por UC
+            uc, room = parts
+            uc_room_required[uc] = room
+        elif tag == "oc":     # aulas online por (UC, índice)
+            uc, idx = parts
+            uc_online_idx[uc].add(int(idx))
+
+    # Derivados (uma linha repetida no ficheiro substitui a anterior)
+    uc_to_class = {uc: c for c, ucs in class_to_ucs.items() for uc in ucs}
+    uc_to_teacher = {uc: t for t, ucs in teacher_to_ucs.items() for uc in ucs}
+
+    return {
+        "class_to_ucs": class_to_ucs,
+        "teacher_to_ucs": teacher_to_ucs,
+        "teacher_unavail": teacher_unavail,
+        "uc_room_required": uc_room_required,
+        "uc_online_idx": uc_online_idx,
+        "uc_to_class": uc_to_class,
+        "uc_to_teacher": uc_to_teacher,
+        "UCs": sorted(uc_to_class),
+    }
+
+
+# ---- Cache em disco ----
+def content_hash(path):
+    """sha256 do conteúdo do ficheiro (lido aos blocos)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _cache_file(digest, cache_dir):
+    return pathlib.Path(cache_dir) / f"{digest}.dataset"
+
+def _load_cached(file):
+    try:
+        version, data = marshal.loads(file.read_bytes())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != CACHE_VERSION:
+        return None
+    data["uc_online_idx"] = defaultdict(set, data["uc_online_idx"])
+    return data
+
+def _store_cached(file, data):
+    plain = dict(data, uc_online_idx=dict(data["uc_online_idx"]))
+    tmp = file.with_name(f"{file.name}.{os.getpid()}.tmp")
+    try:
+        file.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_bytes(marshal.dumps((CACHE_VERSION, plain)))
+        os.replace(tmp, file)   # atómico: outro processo nunca lê um ficheiro a meio
+    except OSError:
+        tmp.unlink(missing_ok=True)   # sem cache (disco só de leitura, ...): segue sem ela
+
+def load_dataset(path, cache=True, cache_dir=None):
+    """
+    Dataset de um ficheiro ClassTT: dict com class_to_ucs, teacher_to_ucs,
+    teacher_unavail, uc_room_required, uc_online_idx, uc_to_class,
+    uc_to_teacher e UCs (ordenadas). Com cache=True reutiliza o parse guardado
+    em cache_dir (CACHE_DIR por omissão) para ficheiros com o mesmo conteúdo.
+    """
+    if not cache:
+        with open(path, encoding="utf-8") as f:
+            return parse_dataset(f)
+    file = _cache_file(content_hash(path), cache_dir or CACHE_DIR)
+    data = _load_cached(file) if file.exists() else None
+    if data is None:
+        with open(path, encoding="utf-8") as f:
+            data = parse_dataset(f)
+        _store_cached(file, data)
+    return data
@@ -0,0 +1,194 @@
+# localsearch.py
+# Otimizador anytime por pesquisa local (simulated annealing + lista tabu),
+# semeado com a 1.ª solução viável do CSP. Todos os movimentos mantêm as
+# restrições hard; o score é avaliado por deltas (DeltaScorer de main.py).
+
+import math
+import random
+import time
+
+BUSY = "<ocupada>"   # ocupante de _room_at para as salas de busy_rooms (nunca é uma aula)
+
+
+class LocalSearch:
+    """
+    lessons: var_infos de compute_var_infos (name, mode, teacher, turma, valid_slots, rooms).
+    pairs:   pares (v1, v2) das duas aulas da mesma UC.
+    scorer:  objeto com .score e .update({var: valor}) -> score (ex.: DeltaScorer),
+             já inicializado com a solução de partida.
+    busy_rooms: pares (slot, sala) já ocupados fora desta pesquisa (p.ex. por outro componente).
+    """
+
+    def __init__(self, lessons, pairs, slot_day, scorer,
+                 rooms=True, max3=True, online_same_day=True, busy_rooms=(), seed=None):
+        self.slot_day = slot_day
+        self.scorer = scorer
+        self.rooms = rooms
+        self.max3 = max3
+        self.online_same_day = online_same_day
+        self.rng = random.Random(seed)
+
+        self.info = {vi["name"]: vi for vi in lessons}
+        self.names = [vi["name"] for vi in lessons]
+        self.partner = {}
+        for v1, v2 in pairs:
+            self.partner[v1] = (v2, True)
+            self.partner[v2] = (v1, False)
+        self.by_class = {}
+        for vi in lessons:
+            self.by_class.setdefault(vi["turma"], []).append(vi["name"])
+
+        self.sol = dict(scorer.sol)
+        self._teacher_at, self._class_at, self._room_at = {}, {}, {}
+        if rooms:
+            self._room_at.update(dict.fromkeys(busy_rooms, BUSY))
+        self._day_count = {}
+        for v, val in self.sol.items():
+            self._place(v, val)
+
+    # ---- Ocupação ----
+    def _place(self, v, val):
+        vi, (s, r, m) = self.info[v], val
+        self._teacher_at[(vi["teacher"], s)] = v
+        self._class_at[(vi["turma"], s)] = v
+        if self.rooms and m == "presencial":
+            self._room_at[(s, r)] = v
+        key = (vi["turma"], self.slot_day(s))
+        self._day_count[key] = self._day_count.get(key, 0) + 1
+        self.sol[v] = val
+
+    def _lift(self, v):
+        vi, (s, r, m) = self.info[v], self.sol[v]
+        del self._teacher_at[(vi["teacher"], s)]
+        del self._class_at[(vi["turma"], s)]
+        if self.rooms and m == "presencial":
+            del self._room_at[(s, r)]
+        self._day_count[(vi["turma"], self.slot_day(s))] -= 1
+        del self.sol[v]
+
+    def _allowed(self, v, val):
+        """Hard constraints para pôr v=val dado o resto da solução atual."""
+        vi, (s, r, m) = self.info[v], val
+        if (vi["teacher"], s) in self._teacher_at or (vi["turma"], s) in self._class_at:
+            return False
+        if self.rooms and m == "presencial" and (s, r) in self._room_at:
+            return False
+        if self.max3 and self._day_count.get((vi["turma"], self.slot_day(s)), 0) >= 3:
+            return False
+        if v in self.partner:
+            w, first = self.partner[v]
+            other = self.sol.get(w)
+            if other is not None:
+                if (s >= other[0]) if first else (other[0] >= s):
+                    return False
+                if (self.online_same_day and m == "online" and other[2] == "online"
+                        and self.slot_day(s) != self.slot_day(other[0])):
+                    return False
+        return True
+
+    def _apply(self, changes):
+        """Tenta aplicar {var: valor}; se violar alguma hard, repõe tudo e devolve False."""
+        old = {v: self.sol[v] for v in changes}
+        for v in changes:
+            self._lift(v)
+        placed = []
+        for v, val in changes.items():
+            if not self._allowed(v, val):
+                for w in placed:
+                    self._lift(w)
+                for w, wval in old.items():
+                    self._place(w, wval)
+                return None
+            self._place(v, val)
+            placed.append(v)
+        return old
+
+    # ---- Movimentos ----
+    def _pick_room(self, v, s, exclude=()):
+        vi = self.info[v]
+        if vi["mode"] != "presencial":
+            return vi["rooms"][0]
+        rooms = [r for r in vi["rooms"]
+                 if not self.rooms or self._room_at.get((s, r)) in (None, v) or self._room_at.get((s, r)) in exclude]
+        return self.rng.choice(rooms) if rooms else None
+
+    def _move_slot(self, v):
+        vi = self.info[v]
+        s = self.rng.choice(vi["valid_slots"])
+        r = self._pick_room(v, s)
+        if r is None or s == self.sol[v][0]:
+            return None
+        return {v: (s, r, vi["mode"])}
+
+    def _swap_in_class(self, v):
+        mates = self.by_class[self.info[v]["turma"]]
+        w = self.rng.choice(mates)
+        if w == v:
+            return None
+        sv, sw = self.sol[v][0], self.sol[w][0]
+        if sw not in self.info[v]["valid_slots"] or sv not in self.info[w]["valid_slots"]:
+            return None
+        rv = self._pick_room(v, sw, exclude=(w,))
+        rw = self._pick_room(w, sv, exclude=(v,))
+        if rv is None or rw is None:
+            return None
+        return {v: (sw, rv, self.info[v]["mode"]), w: (sv, rw, self.info[w]["mode"])}
+
+    def _change_room(self, v):
+        vi = self.info[v]
+        s, r, m = self.sol[v]
+        if m != "presencial" or len(vi["rooms"]) < 2:
+            return None
+        r2 = self._pick_room(v, s)
+        if r2 is None or r2 == r:
+            return None
+        return {v: (s, r2, m)}
+
+    # ---- Ciclo principal ----
+    def run(self, seconds=5.0, max_iters=200000, temp0=2.0, cooling=0.9995,
+            tabu_tenure=7):
+        """
+        Devolve (melhor_solução, melhor_score, histórico), com histórico a lista
+        de (segundos desde o início, melhor score) de cada melhoria.
+        """
+        start = time.monotonic()
+        deadline = start + seconds
+        cur = self.scorer.score
+        best, best_score = dict(self.sol), cur
+        history = [(0.0, best_score)]
+        tabu = {}       # variável -> iteração até à qual não pode ser mexida
+        temp = temp0
+        moves = (self._move_slot, self._swap_in_class, self._change_room)
+
+        for it in range(max_iters):
+            if (it & 255) == 0 and time.monotonic() > deadline:
+                break
+            v = self.rng.choice(self.names)
+            changes = self.rng.choice(moves)(v)
+            if not changes:
+                continue
+            old = self._apply(changes)
+            if old is None:
+                continue
+            new = self.scorer.update(changes)
+            delta = new - cur
+            is_tabu = any(tabu.get(w, -1) >= it for w in changes)
+            if is_tabu and new <= best_score:
+                accept = False          # tabu, sem critério de aspiração
+            elif delta >= 0:
+                accept = True
+            else:
+                accept = temp > 1e-9 and self.rng.random() < math.exp(delta / temp)
+            if accept:
+                cur = new
+                for w in changes:
+                    tabu[w] = it + tabu_tenure
+                if cur > best_score:
+                    best, best_score = dict(self.sol), cur
+                    history.append((time.monotonic() - start, best_score))
+            else:
+                self._apply(old)
+                self.scorer.update(old)
+            temp *= cooling
+
+        return best, best_score, history
@@ -1,6 +1,17 @@
-from constraint import Problem  # pyright: ignore[reportMissingImports]
+from constraint import Problem, Constraint, FunctionConstraint, Unassigned, BacktrackingSolver  # pyright: ignore[reportMissingImports]
 from collections import defaultdict
-import re, pathlib, sys, time, signal
+import itertools, pathlib, sys, time, json
+
+from solver import (BitsetSolver, Budget, NogoodStore, SearchStats, alldiff_prune, assign_by_matching,
+                    max_flow)
+from dataset import load_dataset
+from localsearch import LocalSearch
+from model import POOL_ROOM, Model
+from solcache import SolutionCache
+try:
+    from batchscore import BatchScorer
+except ImportError:   # NumPy é opcional: sem ele, a enumeração pontua com DeltaScorer
+    BatchScorer = None
 
 DATA_PATH = "ClassTT_01_tiny.txt"
 
@@ -12,71 +23,30 @@ SLOTS = list(range(1, 5 * BLOCKS_PER_DAY + 1))  # 1..20
 def slot_day(slot: int) -> str:
     return DAYS[(slot - 1) // BLOCKS_PER_DAY]
 
-# ---- Leitura/parse do dataset ----
-def read_section(raw: str, tag: str):
-    pat = re.compile(rf"#{tag}[^\n]\n(.?)(?=\n#|$)", re.S)
-    m = pat.search(raw)
-    return [] if not m else [ln.strip() for ln in m.group(1).strip().splitlines() if ln.strip()]
-
-def load_dataset(path: str):
-    raw = pathlib.Path(path).read_text(encoding="utf-8")
-
-    head = read_section(raw, "head")
-    cc   = read_section(raw, "cc")   # classe -> UCs
-    dsd  = read_section(raw, "dsd")  # docente -> UCs
-    tr   = read_section(raw, "tr")   # indisponibilidades por docente (slots)
-    rr   = read_section(raw, "rr")   # restrição de sala por UC
-    oc   = read_section(raw, "oc")   # aulas online por (UC, índice)
-
-    # Mapas básicos
-    class_to_ucs = {}
-    for ln in cc:
-        parts = ln.split()
-        class_to_ucs[parts[0]] = parts[1:]
-
-    teacher_to_ucs = {}
-    for ln in dsd:
-        parts = ln.split()
-        teacher_to_ucs[parts[0]] = parts[1:]
-
-    teacher_unavail = {}
-    for ln in tr:
-        parts = ln.split()
-        teacher_unavail[parts[0]] = set(map(int, parts[1:]))
-
-    uc_room_required = {}
-    for ln in rr:
-        uc, room = ln.split()
-        uc_room_required[uc] = room
-
-    uc_online_idx = defaultdict(set)
-    for ln in oc:
-        uc, idx = ln.split()
-        uc_online_idx[uc].add(int(idx))
-
-    # Derivados
-    uc_to_class = {}
-    for c, ucs in class_to_ucs.items():
-        for uc in ucs:
-            uc_to_class[uc] = c
-
-    uc_to_teacher = {}
-    for t, ucs in teacher_to_ucs.items():
-        for uc in ucs:
-            uc_to_teacher[uc] = t
-
-    UCs = sorted(uc_to_class.keys())
-
-    return {
-        "class_to_ucs": class_to_ucs,
-        "teacher_to_ucs": teacher_to_ucs,
-        "teacher_unavail": teacher_unavail,
-        "uc_room_required": uc_room_required,
-        "uc_online_idx": uc_online_idx,
-        "uc_to_class": uc_to_class,
-        "uc_to_teacher": uc_to_teacher,
-        "UCs": UCs
-    }
+# ---- Níveis da cascata (ver try_solve_with_budget) ----
+BASE_ROOMS = ("SalaA", "SalaB")   # salas base por omissão (as UCs sem #rr)
+
+# Níveis do mais restrito para o mais relaxado: (descrição, kwargs de build_problem, soft_max3)
+LAYERS = [
+    ("Modelo completo",
+     dict(enforce_online_same_day=True,  enforce_max3_per_day=True,  base_rooms=BASE_ROOMS,       split_week=False, test_ignore_rooms=False, test_ignore_max3=False, var_order="domwdeg", val_order="score", room_matching=True),
+     False),
+    ("Sem online_same_day",
+     dict(enforce_online_same_day=False, enforce_max3_per_day=True,  base_rooms=BASE_ROOMS,       split_week=False, test_ignore_rooms=False, test_ignore_max3=False, var_order="domwdeg", val_order="score", room_matching=True),
+     False),
+    ("Menos salas (1 sala base)",
+     dict(enforce_online_same_day=False, enforce_max3_per_day=True,  base_rooms=("SalaA",),       split_week=False, test_ignore_rooms=False, test_ignore_max3=False, var_order="domwdeg", val_order="score", room_matching=True),
+     False),
+    ("Split semana (_1 1ª metade; _2 2ª)",
+     dict(enforce_online_same_day=False, enforce_max3_per_day=True,  base_rooms=("SalaA",),       split_week=True,  test_ignore_rooms=False, test_ignore_max3=False, var_order="domwdeg", val_order="score", room_matching=True),
+     False),
+    ("Sem max3_por_dia como hard (fica soft)",
+     dict(enforce_online_same_day=False, enforce_max3_per_day=False, base_rooms=("SalaA",),       split_week=True,  test_ignore_rooms=False, test_ignore_max3=False, var_order="dom", val_order="score", room_matching=True),
+     True),
+    ("TESTE: ignorar rooms e max3 (viabilidade estrutural)",
+     dict(enforce_online_same_day=False, enforce_max3_per_day=False, base_rooms=BASE_ROOMS,       split_week=False, test_ignore_rooms=True,  test_ignore_max3=True,  var_order="dom", val_order="score"),
+     True),
+]
 
 # ---------- DIAGNÓSTICO ----------
 def print_dataset_snapshot(data):
@@ -87,55 +57,23 @@ def print_dataset_snapshot(data):
     for t, ucs in data["teacher_to_ucs"].items():
         print(f"   Docente {t}: UCs={ucs} | indisponíveis={sorted(data['teacher_unavail'].get(t, set()))}")
 
-def compute_var_infos(data, base_rooms=("SalaA","SalaB"), split_week=False):
-    uc_to_class    = data["uc_to_class"]
-    uc_to_teacher  = data["uc_to_teacher"]
-    uc_room_req    = data["uc_room_required"]
-    teacher_unav   = data["teacher_unavail"]
-    uc_online_idx  = data["uc_online_idx"]
-    UCs            = data["UCs"]
-
+def compute_var_infos(data, base_rooms=BASE_ROOMS, split_week=False, model=None, busy_rooms=()):
+    model = model or Model(data, SLOTS, base_rooms)
+    lessons, _ = model.layer(base_rooms, split_week, busy_rooms)
     var_infos = []
-    for uc in UCs:
-        for i in (1, 2):
-            name = f"{uc}_{i}"
-            teacher = uc_to_teacher[uc]
-            turma = uc_to_class[uc]
-            bad = teacher_unav.get(teacher, set())
-            valid_slots = [s for s in SLOTS if s not in bad]
-
-            if split_week:
-                mid = len(SLOTS) // 2
-                pivot = SLOTS[mid-1]
-                if i == 1:
-                    valid_slots = [s for s in valid_slots if s <= pivot]
-                else:
-                    valid_slots = [s for s in valid_slots if s > pivot]
-
-            is_online = i in uc_online_idx.get(uc, set())
-            mode = "online" if is_online else "presencial"
-
-            if is_online:
-                rooms = [f"Online::{uc}"]
-            else:
-                rooms = [uc_room_req[uc]] if uc in uc_room_req else list(base_rooms)
-
-            domain = [(s, r, mode) for s in sorted(valid_slots) for r in sorted(rooms)]
-            var_infos.append({
-                "name": name,
-                "mode": mode,
-                "teacher": teacher,
-                "turma": turma,
-                "valid_slots": sorted(valid_slots),
-                "rooms": rooms,
-                "domain_size": len(domain),
-                "sample": domain[:min(5, len(domain))]
-            })
+    for lesson in lessons:
+        vi = model.var_info(lesson)
+        domain = vi.pop("domain")
+        for key in ("inperson", "pool", "valid_slots_only"):
+            del vi[key]
+        vi["domain_size"] = len(domain)
+        vi["sample"] = domain[:min(5, len(domain))]
+        var_infos.append(vi)
     return var_infos
 
-def run_diagnostics(data):
+def run_diagnostics(data, model=None):
     print_dataset_snapshot(data)
-    var_infos = compute_var_infos(data)
+    var_infos = compute_var_infos(data, model=model)
     zeros = [v for v in var_infos if v["domain_size"] == 0]
 
     print("\n[DOMÍNIOS POR VARIÁVEL]")
@@ -169,132 +107,534 @@ def run_diagnostics(data):
 
     print("\n[FIM DIAGNÓSTICO]\n")
 
+# ---- Restrições globais (python-constraint) ----
+class IncrementalConstraint(Constraint):
+    """
+    Restrição com estado (tabela ou contadores) atualizado em O(1) por
+    atribuição, em vez de rever todas as variáveis a cada chamada. Só é
+    correta sob o protocolo do DeadlineSolver:
+      - reset() no início de cada pesquisa (e release() no fim);
+      - unassign(var) antes de desfazer ou trocar o valor de uma variável;
+      - a variável acabada de atribuir é sempre a última chave de
+        `assignments` (só a mais funda é reatribuída).
+    Chamada fora de uma pesquisa do DeadlineSolver (p.ex. com o
+    BacktrackingSolver de origem), levanta RuntimeError em vez de dar uma
+    resposta errada. As subclasses implementam clear(), unassign() e place().
+    """
+    _armed = False
+
+    def reset(self):
+        self.clear()
+        self._armed = True
+
+    def release(self):
+        self._armed = False
+
+    def preProcess(self, variables, domains, constraints, vconstraints):
+        # unária: cada valor é avaliado sozinho, com o estado limpo
+        if len(variables) == 1:
+            variable = variables[0]
+            domain = domains[variable]
+            for value in domain[:]:
+                self.reset()
+                if not self(variables, domains, {variable: value}):
+                    domain.remove(value)
+            self.release()
+            constraints.remove((self, variables))
+            vconstraints[variable].remove((self, variables))
+
+    def __call__(self, variables, domains, assignments, forwardcheck=False,
+                 _unassigned=Unassigned):
+        if not self._armed:
+            raise RuntimeError(f"{type(self).__name__} só funciona com o DeadlineSolver (ver build_problem)")
+        return self.place(variables, domains, assignments, forwardcheck)
+
+class RoomSlotConstraint(IncrementalConstraint):
+    """
+    (A) Sala+slot únicos entre aulas presenciais, com forward checking.
+    Tabela slot×sala: a cada nova ocupação, esconde esse (slot, sala) só dos
+    domínios das presenciais por atribuir que o têm (índice valor -> variáveis).
+    """
+    family = "room"
+
+    def clear(self):
+        self._owner = {}     # (slot, sala) -> variável que a ocupa
+        self._placed = {}    # variável -> (slot, sala)
+        self._holders = None  # valor -> variáveis cujo domínio inicial o contém
+
+    def unassign(self, var):
+        key = self._placed.pop(var, None)
+        if key is not None:
+            del self._owner[key]
+
+    def place(self, variables, domains, assignments, forwardcheck):
+        owner, placed = self._owner, self._placed
+        if self._holders is None:
+            self._holders = defaultdict(list)
+            for v in variables:
+                # inclui os valores que outras restrições já esconderam neste ramo
+                for val in list(domains[v]) + list(getattr(domains[v], "_hidden", ())):
+                    self._holders[val].append(v)
+
+        var = next(reversed(assignments))
+        val = assignments[var]
+        key = (val[0], val[1])
+        if key in owner:
+            return False
+        owner[key] = var
+        placed[var] = key
+
+        if forwardcheck:
+            for other in self._holders[val]:
+                if other in assignments:
+                    continue
+                domain = domains[other]
+                if val in domain:
+                    domain.hideValue(val)
+                    if not domain:
+                        return False
+        return True
+
+class SlotAllDifferentConstraint(Constraint):
+    """
+    (B)/(C) Aulas do mesmo docente/turma em slots distintos, com propagação por
+    emparelhamento (Régin): com forward checking, esconde dos domínios livres os
+    slots que não entram em nenhum emparelhamento completo do grupo.
+    family: "teacher" ou "class" (para as estatísticas).
+    """
+    def __init__(self, family="teacher"):
+        self.family = family
+
+    def __call__(self, variables, domains, assignments, forwardcheck=False,
+                 _unassigned=Unassigned):
+        slots = {}
+        for var in variables:
+            val = assignments.get(var, _unassigned)
+            if val is _unassigned:
+                slots[var] = {v[0] for v in domains[var]}
+            else:
+                slots[var] = {val[0]}
+        removed = alldiff_prune(slots)
+        if removed is None:
+            return False
+        if forwardcheck:
+            for var, bad in removed.items():
+                domain = domains[var]
+                for val in [v for v in domain if v[0] in bad]:
+                    domain.hideValue(val)
+                if not domain:
+                    return False
+        return True
+
+class CountingConstraint(IncrementalConstraint):
+    """
+    No máximo limit(k) variáveis com key(valor) == k, com contador por chave.
+    Quando uma chave enche, os valores dessa chave são escondidos dos domínios
+    das variáveis ainda por atribuir.
+    """
+
+    def __init__(self, key, limit, family):
+        self._key = key
+        self._limit = limit
+        self.family = family
+
+    def clear(self):
+        self._placed = {}               # variável -> chave
+        self._count = defaultdict(int)  # chave -> nº de variáveis atribuídas
+
+    def unassign(self, var):
+        k = self._placed.pop(var, None)
+        if k is not None:
+            self._count[k] -= 1
+
+    def place(self, variables, domains, assignments, forwardcheck):
+        placed, count, key = self._placed, self._count, self._key
+        var = next(reversed(assignments))
+        k = key(assignments[var])
+        limit = self._limit(k)
+        if count[k] >= limit:
+            return False
+        placed[var] = k
+        count[k] += 1
+
+        if forwardcheck and count[k] == limit:
+            for other in variables:
+                if other in assignments:
+                    continue
+                domain = domains[other]
+                for val in [v for v in domain if key(v) == k]:
+                    domain.hideValue(val)
+                if not domain:
+                    return False
+        return True
+
+class MaxPerDayConstraint(CountingConstraint):
+    """(D) Máx. `limit` aulas por dia numa turma."""
+
+    def __init__(self, limit=3):
+        super().__init__(lambda val: slot_day(val[0]), lambda day: limit, "max3")
+
+class PoolCapacityConstraint(CountingConstraint):
+    """
+    (A') Modo room_matching: em cada slot, as aulas que ocupam uma sala base não
+    podem ser mais do que as salas base livres (capacity: slot -> nº de salas).
+    """
+
+    def __init__(self, capacity):
+        super().__init__(lambda val: val[0], lambda slot: capacity.get(slot, 0), "room")
+
+# ---- Solver python-constraint com orçamento cooperativo ----
+class DeadlineSolver(BacktrackingSolver):
+    """
+    BacktrackingSolver do python-constraint que verifica um Budget a cada nó:
+    quando o orçamento acaba, o iterador de soluções termina normalmente
+    (sem SIGALRM, por isso funciona fora da thread principal). Segue o
+    protocolo das IncrementalConstraint.
+    """
+    def __init__(self, forwardcheck=True, budget=None):
+        super().__init__(forwardcheck)
+        self.budget = budget
+        self.stats = SearchStats()
+
+    def getSolutionIter(self, domains, constraints, vconstraints):
+        incremental = [c for c, _ in constraints if isinstance(c, IncrementalConstraint)]
+        for constraint in incremental:
+            constraint.reset()
+        try:
+            yield from self._search(domains, vconstraints)
+        finally:
+            for constraint in incremental:
+                constraint.release()
+
+    def _search(self, domains, vconstraints):
+        # Igual a BacktrackingSolver.getSolutionIter, com budget.tick() por valor tentado
+        # e contadores em self.stats (a família vem do atributo `family` da restrição)
+        forwardcheck = self._forwardcheck
+        budget, stats = self.budget, self.stats
+        assignments = {}
+        queue = []
+        undo = {v: [c.unassign for c, _ in vconstraints[v] if isinstance(c, IncrementalConstraint)]
+                for v in domains}
+
+        def unassign(variable):
+            for f in undo[variable]:
+                f(variable)
+
+        while True:
+            # MRV + grau, como no original
+            lst = [(-len(vconstraints[variable]), len(domains[variable]), variable)
+                   for variable in domains]
+            lst.sort()
+            for item in lst:
+                if item[-1] not in assignments:
+                    variable = item[-1]
+                    values = domains[variable][:]
+                    if forwardcheck:
+                        pushdomains = [domains[x] for x in domains
+                                       if x not in assignments and x != variable]
+                    else:
+                        pushdomains = None
+                    break
+            else:
+                stats.on_solution()
+                yield assignments.copy()
+                if not queue:
+                    return
+                variable, values, pushdomains = queue.pop()
+                if pushdomains:
+                    for domain in pushdomains:
+                        domain.popState()
+
+            while True:
+                if not values:
+                    stats.backtracks += 1
+                    unassign(variable)
+                    del assignments[variable]
+                    while queue:
+                        variable, values, pushdomains = queue.pop()
+                        if pushdomains:
+                            for domain in pushdomains:
+                                domain.popState()
+                        if values:
+                            break
+                        unassign(variable)
+                        del assignments[variable]
+                    else:
+                        return
+
+                if budget is not None and not budget.tick():
+                    return
+                stats.nodes += 1
+                if variable in assignments:
+                    unassign(variable)
+                assignments[variable] = values.pop()
+
+                if pushdomains:
+                    for domain in pushdomains:
+                        domain.pushState()
+
+                for constraint, variables in vconstraints[variable]:
+                    family = getattr(constraint, "family", None)
+                    if family:
+                        stats.checks[family] += 1
+                    if not constraint(variables, domains, assignments, pushdomains):
+                        if family and pushdomains and any(not d for d in pushdomains):
+                            stats.wipeouts[family] += 1
+                        break
+                else:
+                    break
+
+                if pushdomains:
+                    for domain in pushdomains:
+                        domain.popState()
+
+            queue.append((variable, values, pushdomains))
+
+def set_budget(problem, budget):
+    """Associa um Budget ao problema devolvido por build_problem (qualquer backend)."""
+    if isinstance(problem, BitsetSolver):
+        problem.budget = budget
+    else:
+        problem.getSolver().budget = budget
+
+def set_stats(problem, stats):
+    """Associa um SearchStats ao problema devolvido por build_problem (qualquer backend)."""
+    if isinstance(problem, BitsetSolver):
+        problem.stats = stats
+    else:
+        problem.getSolver().stats = stats
+
 # ---- Construção do problema CSP (com MRV e opções) ----
+def layer_var_infos(data, base_rooms=BASE_ROOMS, split_week=False, busy_rooms=(),
+                    room_matching=False, model=None):
+    """
+    Domínios de um nível (ver build_problem), já descodificados: devolve
+    (var_infos, pool_capacity), com pool_capacity = slot -> nº de salas base livres.
+    model: Model já construído para o dataset (p.ex. o de um CompiledModel).
+    """
+    model = model or Model(data, SLOTS, base_rooms)
+    lessons, pool_capacity = model.layer(base_rooms, split_week, busy_rooms, room_matching)
+    return [model.var_info(l) for l in lessons], pool_capacity
+
+def _slot_conflicts(var_infos, teachers, classes, max3_classes):
+    """
+    Hall por docente (aulas -> slots distintos) para `teachers` e por turma para
+    `classes` (fluxo aula -> slot -> dia, com capacidade 3 por dia nas turmas de
+    `max3_classes`). Devolve a lista de motivos das que não cabem.
+    """
+    reasons = []
+    slots_of = {vi["name"]: {v[0] for v in vi["domain"]} for vi in var_infos}
+    by_teacher, by_class = defaultdict(list), defaultdict(list)
+    for vi in var_infos:
+        by_teacher[vi["teacher"]].append(vi["name"])
+        by_class[vi["turma"]].append(vi["name"])
+
+    for t, vs in by_teacher.items():
+        if t in teachers and assign_by_matching({v: slots_of[v] for v in vs}) is None:
+            reasons.append(f"docente {t}: {len(vs)} aulas não cabem em slots distintos")
+
+    for c, vs in by_class.items():
+        if c not in classes:
+            continue
+        max3 = c in max3_classes
+        capacity = {}
+        for v in vs:
+            capacity[("src", v)] = 1
+            for sl in slots_of[v]:
+                capacity[(v, ("slot", sl))] = 1
+                capacity[(("slot", sl), ("day", slot_day(sl)))] = 1
+                capacity[(("day", slot_day(sl)), "snk")] = 3 if max3 else BLOCKS_PER_DAY
+        if max_flow(capacity, "src", "snk") < len(vs):
+            extra = " com máx. 3 por dia" if max3 else ""
+            reasons.append(f"turma {c}: {len(vs)} aulas não cabem em slots distintos{extra}")
+    return reasons
+
+def precheck_layer(data, kwargs, model=None):
+    """
+    Verificação polinomial (emparelhamentos e fluxos) antes de lançar a pesquisa:
+      - Hall por docente: aulas -> slots distintos;
+      - Hall por turma, com o máx. 3 por dia se for hard: fluxo aula -> slot -> dia (cap. 3);
+      - salas: aulas presenciais -> pares (slot, sala) distintos (Lab01 e afins,
+        e as salas base, incluindo as ocupadas por busy_rooms).
+    Cada teste é uma relaxação do modelo, por isso uma falha prova que o nível
+    não tem solução. Devolve a lista de motivos (vazia = nada provado).
+    model: Model já construído para o dataset (evita recalcular os domínios).
+    """
+    room_matching = kwargs.get("room_matching", False) and not kwargs.get("test_ignore_rooms", False)
+    base_rooms = kwargs.get("base_rooms", BASE_ROOMS)
+    busy_rooms = kwargs.get("busy_rooms", ())
+    var_infos, _ = layer_var_infos(data, base_rooms, kwargs.get("split_week", False),
+                                   busy_rooms, room_matching, model=model)
+    max3 = kwargs.get("enforce_max3_per_day", True) and not kwargs.get("test_ignore_max3", False)
+    teachers = {vi["teacher"] for vi in var_infos}
+    classes = {vi["turma"] for vi in var_infos}
+    reasons = _slot_conflicts(var_infos, teachers, classes, classes if max3 else ())
+
+    if not kwargs.get("test_ignore_rooms", False):
+        pairs = {}
+        for vi in var_infos:
+            if vi["mode"] != "presencial":
+                continue
+            pairs[vi["name"]] = {(sl, r) for (sl, room, _) in vi["domain"]
+                                 for r in ([room] if room != POOL_ROOM else base_rooms)
+                                 if (sl, r) not in busy_rooms}
+        if pairs and assign_by_matching(pairs) is None:
+            reasons.append(f"salas: {len(pairs)} aulas presenciais não cabem em pares (slot, sala) distintos")
+    return reasons
+
 def build_problem(data,
                   enforce_online_same_day=True,
                   enforce_max3_per_day=True,
-                  base_rooms=("SalaA", "SalaB"),
+                  base_rooms=BASE_ROOMS,
                   split_week=False,
                   test_ignore_rooms=False,
-                  test_ignore_max3=False):
+                  test_ignore_max3=False,
+                  backend="constraint",
+                  var_order="dom",
+                  val_order="lex",
+                  nogoods=None,
+                  busy_rooms=(),
+                  room_matching=False,
+                  compiled=None,
+                  fixed=None,
+                  groups=None):
     """
     split_week: força _1 a usar 1ª metade dos slots e _2 a 2ª metade (quebra simetria forte).
     test_ignore_rooms: ignora colisão de sala+slot (para testar viabilidade sem salas).
     test_ignore_max3: ignora 'máx. 3 por dia' (para testar viabilidade sem essa hard).
+    backend: "constraint" (python-constraint) ou "bitset" (motor nativo em solver.py,
+             com ocupação em bitmasks); ambos expõem getSolution/getSolutionIter.
+    var_order: escolha dinâmica da variável no backend "bitset" ("static", "dom" ou
+               "domwdeg", ver BitsetSolver). O python-constraint usa sempre MRV+grau.
+    val_order: ordem dos valores no backend "bitset" ("lex", "lcv" ou "score").
+    nogoods: NogoodStore partilhado pelo backend "bitset" (backjumping + nogoods
+             reaproveitados entre pesquisas e níveis compatíveis).
+    busy_rooms: pares (slot, sala) já ocupados fora deste modelo (p.ex. por outro
+                componente, ver try_solve_components); saem dos domínios presenciais.
+    room_matching: as presenciais sem #rr escolhem só o slot (sala POOL_ROOM) e
+                   um contador por slot garante que há salas base que cheguem; as
+                   salas concretas são dadas no fim por assign_rooms.
+    compiled: CompiledModel do dataset; o nível sai dos domínios já compilados
+              (só filtrados) e, no backend "bitset", usa os nogoods e o arranque
+              a quente guardados pelos níveis anteriores.
+    fixed: aula -> valor (slot, sala, modo); essas aulas ficam só com esse valor
+           (ou sem nenhum, se já não for possível). Usado por repair_solution.
+    groups: se dado, só entram as restrições destes grupos de constraint_groups
+            (a ordem _1 antes de _2 fica sempre); só no backend "constraint".
+            Usado por groups_consistent.
     """
-    uc_to_class    = data["uc_to_class"]
-    uc_to_teacher  = data["uc_to_teacher"]
-    uc_room_req    = data["uc_room_required"]
-    teacher_unav   = data["teacher_unavail"]
-    uc_online_idx  = data["uc_online_idx"]
-    UCs            = data["UCs"]
-
-    # Pré-computa domínios (para MRV) e valida capacidade mínima
-    var_infos = []
-    for uc in UCs:
-        for i in (1, 2):
-            name = f"{uc}_{i}"
-            teacher = uc_to_teacher[uc]
-            turma = uc_to_class[uc]
-            bad = teacher_unav.get(teacher, set())
-            valid_slots = [s for s in SLOTS if s not in bad]
-
-            if split_week:
-                mid = len(SLOTS) // 2
-                pivot = SLOTS[mid-1]
-                if i == 1:
-                    valid_slots = [s for s in valid_slots if s <= pivot]
-                else:
-                    valid_slots = [s for s in valid_slots if s > pivot]
-
-            is_online = i in uc_online_idx.get(uc, set())
-            mode = "online" if is_online else "presencial"
-
-            if is_online:
-                rooms = [f"Online::{uc}"]
-            else:
-                rooms = [uc_room_req[uc]] if uc in uc_room_req else list(base_rooms)
-
-            domain = [(s, r, mode) for s in sorted(valid_slots) for r in sorted(rooms)]
-            var_infos.append({
-                "name": name,
-                "domain": domain,
-                "mode": mode,
-                "teacher": teacher,
-                "turma": turma,
-                "inperson": (mode == "presencial"),
-                "valid_slots_only": set(valid_slots)
-            })
-
-    zeros = [vi for vi in var_infos if len(vi["domain"]) == 0]
+    if groups is not None and backend != "constraint":
+        raise ValueError("groups só é suportado no backend \"constraint\"")
+    on = (lambda key: True) if groups is None else (lambda key: key in groups)
+    # Salas base livres por slot (só usado com room_matching; sem salas não há nada a contar)
+    room_matching = room_matching and not test_ignore_rooms
+    model = compiled.model if compiled is not None else Model(data, SLOTS, base_rooms)
+    lessons, pool_capacity = model.layer(base_rooms, split_week, busy_rooms, room_matching)
+    if fixed:
+        lessons = [model.fix(l, fixed[model.name(l)]) if model.name(l) in fixed else l for l in lessons]
+
+    zeros = [l for l in lessons if len(l.domain) == 0]
     if zeros:
         print("\n[ERRO] Algumas variáveis ficaram com domínio vazio:")
-        for vi in zeros:
-            print(f" - {vi['name']} (teacher={vi['teacher']}, turma={vi['turma']}, mode={vi['mode']})")
+        for l in zeros:
+            print(f" - {model.name(l)} (teacher={model.teachers[l.teacher]}, turma={model.classes[l.turma]}, "
+                  f"mode={'online' if l.online else 'presencial'})")
         print("Revê indisponibilidades (tr) e restrições de sala (rr).")
         return None, None, None
 
     teacher_to_vars = defaultdict(list)
     class_to_vars = defaultdict(list)
-    for vi in var_infos:
-        teacher_to_vars[vi["teacher"]].append(vi)
-        class_to_vars[vi["turma"]].append(vi)
+    for l in lessons:
+        teacher_to_vars[l.teacher].append(l)
+        class_to_vars[l.turma].append(l)
 
     # Checks de capacidade mínima
-    for t, vs in teacher_to_vars.items():
-        union = set()
-        for vi in vs:
-            union |= vi["valid_slots_only"]
-        if len(union) < len(vs):
-            print(f"\n[ERRO] Docente {t} tem {len(vs)} aulas mas apenas {len(union)} slots livres possíveis (inviável).")
+    for t, ls in teacher_to_vars.items():
+        union = {v // model.R for l in ls for v in l.domain}
+        if on(("teacher", model.teachers[t])) and len(union) < len(ls):
+            print(f"\n[ERRO] Docente {model.teachers[t]} tem {len(ls)} aulas mas apenas {len(union)} slots livres possíveis (inviável).")
             return None, None, None
 
-    for c, vs in class_to_vars.items():
-        union = set()
-        for vi in vs:
-            union |= vi["valid_slots_only"]
-        if len(union) < len(vs):
-            print(f"\n[ERRO] Turma {c} tem {len(vs)} aulas mas apenas {len(union)} slots livres possíveis (inviável).")
+    for c, ls in class_to_vars.items():
+        union = {v // model.R for l in ls for v in l.domain}
+        if on(("class", model.classes[c])) and len(union) < len(ls):
+            print(f"\n[ERRO] Turma {model.classes[c]} tem {len(ls)} aulas mas apenas {len(union)} slots livres possíveis (inviável).")
             return None, None, None
 
-    # Cria o solver e adiciona variáveis em ordem MRV
-    problem = Problem()
+    lessons = sorted(lessons, key=lambda l: len(l.domain))  # MRV
 
-    var_infos.sort(key=lambda x: len(x["domain"]))  # MRV
-    inperson_vars = []
+    # Estrutura por turma para scoring/impressão
+    by_class = defaultdict(list)
+    for l in lessons:
+        by_class[model.classes[l.turma]].append(model.name(l))
+
+    if backend == "bitset":
+        pairs = [(f"{uc}_1", f"{uc}_2") for uc in data["UCs"]]
+        problem = BitsetSolver(lessons, pairs, slot_day,
+                               rooms=not test_ignore_rooms,
+                               max3=enforce_max3_per_day and not test_ignore_max3,
+                               online_same_day=enforce_online_same_day,
+                               var_order=var_order,
+                               val_order=val_order,
+                               nogoods=nogoods,
+                               pool_capacity=pool_capacity if room_matching else None,
+                               model=model,
+                               hints=compiled.warm if compiled is not None else None)
+        return problem, by_class, data
+
+    # Cria o solver e adiciona variáveis em ordem MRV
+    # (as IncrementalConstraint só funcionam com o DeadlineSolver)
+    problem = Problem(DeadlineSolver())
+
+    var_infos = [model.var_info(l) for l in lessons]
+    if compiled is not None and compiled.warm:
+        # arranque a quente: o python-constraint tenta primeiro o último valor do domínio
+        for vi in var_infos:
+            want = compiled.warm.get(vi["name"])
+            dom = vi["domain"]
+            k = next((k for k, val in enumerate(dom) if val == want), None) if want else None
+            if want and k is None:
+                k = next((k for k, val in enumerate(dom) if val[0] == want[0]), None)
+            if k is not None:
+                dom.append(dom.pop(k))
+    teacher_to_vars = defaultdict(list)
+    class_to_vars = defaultdict(list)
+    inperson_vars, pool_vars = [], []
     for vi in var_infos:
+        teacher_to_vars[vi["teacher"]].append(vi)
+        class_to_vars[vi["turma"]].append(vi)
         problem.addVariable(vi["name"], vi["domain"])
-        if vi["inperson"]:
+        req = data["uc_room_required"].get(model.lesson_uc[vi["name"]])
+        if vi["inperson"] and on(("room", req) if req else ("base",)):
             inperson_vars.append(vi["name"])
+        if vi["pool"] and on(("base",)):
+            pool_vars.append(vi["name"])
 
     # ---- Restrições ----
 
     # (A) Sala+slot únicos (global) só para presenciais
-    def proj_slot_sala(*vals):
-        return len({(s, r) for (s, r, m) in vals}) == len(vals)
     if inperson_vars and (not test_ignore_rooms):
-        problem.addConstraint(proj_slot_sala, tuple(inperson_vars))
+        problem.addConstraint(RoomSlotConstraint(), tuple(inperson_vars))
+
+    # (A') Salas base por slot, sem escolher a sala (room_matching)
+    if pool_vars and (not test_ignore_rooms):
+        problem.addConstraint(PoolCapacityConstraint(pool_capacity), tuple(pool_vars))
 
     # (B) Docente: não pode dar 2 aulas no mesmo slot
-    def no_overlap(*vals):
-        slots = [v[0] for v in vals]
-        return len(slots) == len(set(slots))
     for t, vs in teacher_to_vars.items():
-        problem.addConstraint(no_overlap, tuple(v["name"] for v in vs))
+        if on(("teacher", t)):
+            problem.addConstraint(SlotAllDifferentConstraint("teacher"), tuple(v["name"] for v in vs))
 
     # (C) Turma: não pode ter 2 aulas no mesmo slot
     for c, vs in class_to_vars.items():
-        problem.addConstraint(no_overlap, tuple(v["name"] for v in vs))
+        if on(("class", c)):
+            problem.addConstraint(SlotAllDifferentConstraint("class"), tuple(v["name"] for v in vs))
 
     # (D) Máx. 3 aulas por dia por turma (hard, se não estiver em modo de teste)
     if enforce_max3_per_day and (not test_ignore_max3):
-        def max3_por_dia(*vals):
-            counts = defaultdict(int)
-            for (slot, _, _) in vals:
-                counts[slot_day(slot)] += 1
-            return all(v <= 3 for v in counts.values())
         for c, vs in class_to_vars.items():
-            problem.addConstraint(max3_por_dia, tuple(v["name"] for v in vs))
+            if on(("max3", c)):
+                problem.addConstraint(MaxPerDayConstraint(3), tuple(v["name"] for v in vs))
 
     # (E) Online mesmo dia (opcional)
     def online_same_day(v1, v2):
@@ -308,20 +648,47 @@ def build_problem(data,
     def order(a, b):
         return a[0] < b[0]
 
+    online_c = FunctionConstraint(online_same_day)
+    online_c.family = "online"
+    order_c = FunctionConstraint(order)
+    order_c.family = "order"
+
     UCs = data["UCs"]
     for uc in UCs:
         v1, v2 = f"{uc}_1", f"{uc}_2"
-        if enforce_online_same_day:
-            problem.addConstraint(online_same_day, (v1, v2))
-        problem.addConstraint(order, (v1, v2))
-
-    # Estrutura por turma para scoring/impressão
-    by_class = defaultdict(list)
-    for vi in var_infos:
-        by_class[vi["turma"]].append(vi["name"])
+        if enforce_online_same_day and on(("online", uc)):
+            problem.addConstraint(online_c, (v1, v2))
+        problem.addConstraint(order_c, (v1, v2))
 
     return problem, by_class, data
 
+# ---- Modelo compilado (um por dataset, partilhado pelos níveis) ----
+class CompiledModel:
+    """
+    Construído uma vez por dataset e passado a cada nível de LAYERS:
+      - model: Model com os ids e os domínios completos; cada nível só filtra
+        os domínios (salas base, split, salas ocupadas) e liga/desliga as
+        famílias de restrições em build_problem;
+      - nogoods: NogoodStore com os nogoods e os valores podados na raiz pelos
+        níveis anteriores (cada nível só usa os que continuam válidos nele);
+      - warm: último valor de cada aula (da solução ou da atribuição parcial de
+        um nível anterior), o primeiro a tentar no nível seguinte.
+    rooms: salas base a compilar (por omissão, as de todos os LAYERS).
+    """
+
+    def __init__(self, data, rooms=None):
+        if rooms is None:
+            rooms = {r for _, kwargs, _ in LAYERS for r in kwargs.get("base_rooms", BASE_ROOMS)}
+        self.data = data
+        self.model = Model(data, SLOTS, rooms)
+        self.nogoods = NogoodStore()
+        self.warm = {}
+
+    def remember(self, assignment):
+        """Guarda uma atribuição (completa ou parcial) para o arranque a quente."""
+        if assignment:
+            self.warm.update(assignment)
+
 # ---- Função de score (soft constraints) ----
 def score_solution(sol, by_class, data, soft_max3=True):
     score = 0
@@ -363,28 +730,134 @@ def score_solution(sol, by_class, data, soft_max3=True):
 
     return score
 
+class DeltaScorer:
+    """
+    Versão incremental de score_solution: guarda, por turma e por dia, os slots
+    ocupados e os totais de que dependem os quatro termos, e atualiza-os só
+    para as variáveis que mudaram (O(1) por variável alterada).
+    """
+    def __init__(self, sol, by_class, data, soft_max3=True):
+        self.soft_max3 = soft_max3
+        self.sol = {}
+        self._uc_of, self._class_of = {}, {}
+        for uc in data["UCs"]:
+            self._uc_of[f"{uc}_1"] = self._uc_of[f"{uc}_2"] = uc
+        for turma, tvars in by_class.items():
+            for v in tvars:
+                self._class_of[v] = turma
+        self._slots = {t: defaultdict(set) for t in by_class}   # turma -> dia -> slots
+        self._used = defaultdict(int)     # turma -> nº de dias com aulas
+        self._diff_day = 0                # UCs com as 2 aulas em dias distintos
+        self._consec = 0                  # pares consecutivos (todas as turmas)
+        self._days_pen = 0                # 2 * dias acima de 4 (todas as turmas)
+        self._excess = 0                  # aulas acima de 3 por dia (todas as turmas)
+        for v, val in sol.items():
+            self._add(v, val[0])
+            self.sol[v] = val
+        for uc in data["UCs"]:
+            self._diff_day += self._uc_term(uc)
+
+    def _uc_term(self, uc):
+        a, b = self.sol.get(f"{uc}_1"), self.sol.get(f"{uc}_2")
+        if a is None or b is None:
+            return 0
+        return 1 if slot_day(a[0]) != slot_day(b[0]) else 0
+
+    def _add(self, v, slot):
+        turma, day = self._class_of[v], slot_day(slot)
+        slots = self._slots[turma][day]
+        self._consec += (slot - 1 in slots) + (slot + 1 in slots)
+        if not slots:
+            self._used[turma] += 1
+            if self._used[turma] > 4:
+                self._days_pen += 2
+        if len(slots) >= 3:
+            self._excess += 1
+        slots.add(slot)
+
+    def _remove(self, v, slot):
+        turma, day = self._class_of[v], slot_day(slot)
+        slots = self._slots[turma][day]
+        slots.discard(slot)
+        self._consec -= (slot - 1 in slots) + (slot + 1 in slots)
+        if not slots:
+            if self._used[turma] > 4:
+                self._days_pen -= 2
+            self._used[turma] -= 1
+        if len(slots) >= 3:
+            self._excess -= 1
+
+    @property
+    def score(self):
+        score = self._diff_day + self._consec - self._days_pen
+        if self.soft_max3:
+            score -= self._excess
+        return score
+
+    def update(self, changes):
+        """Aplica {variável: novo valor} e devolve o novo score."""
+        ucs = {self._uc_of[v] for v in changes}
+        for uc in ucs:
+            self._diff_day -= self._uc_term(uc)
+        # primeiro tira tudo e só depois volta a pôr (trocas de slots dentro da turma)
+        for v in changes:
+            old = self.sol.get(v)
+            if old is not None:
+                self._remove(v, old[0])
+        for v, val in changes.items():
+            self._add(v, val[0])
+            self.sol[v] = val
+        for uc in ucs:
+            self._diff_day += self._uc_term(uc)
+        return self.score
+
+    def rescore(self, sol):
+        """Passa para a solução `sol` aplicando só as diferenças face à atual."""
+        cur = self.sol
+        changes = {v: val for v, val in sol.items() if cur.get(v) != val}
+        return self.update(changes) if changes else self.score
+
+def score_stream(solutions, first, by_class, data, soft_max3=True, chunk=256):
+    """
+    (solução, score) por cada solução do iterador. Com NumPy pontua blocos de
+    `chunk` soluções de uma vez (BatchScorer); sem NumPy usa DeltaScorer a
+    partir de `first`.
+    """
+    if BatchScorer is None:
+        scorer = DeltaScorer(first, by_class, data, soft_max3=soft_max3)
+        for s in solutions:
+            yield s, scorer.rescore(s)
+        return
+    scorer = BatchScorer(by_class, data, slot_day, SLOTS)
+    while True:
+        block = list(itertools.islice(solutions, chunk))
+        if not block:
+            return
+        yield from zip(block, scorer.score_solutions(block, soft_max3=soft_max3))
+
 # ---- Impressão legível ----
-def show_by_class(sol, by_class):
+def show_by_class(sol, by_class, model):
+    """model: Model do dataset (p.ex. CompiledModel.model), para ir da aula à UC."""
     print("\n== HORÁRIO POR TURMA ==")
     for turma, tvars in by_class.items():
         print(f"\nTURMA {turma}")
         grid = defaultdict(list)
         for v in tvars:
             slot, room, mode = sol[v]
-            uc = v.split("_")[0]
+            uc = model.lesson_uc[v]
             grid[slot_day(slot)].append((slot, uc, room, mode))
         for d in DAYS:
             row = sorted(grid[d])
             if row:
                 print(d, "→", ", ".join([f"{s}: {uc} @{room} ({mode})" for (s, uc, room, mode) in row]))
 
-def show_by_teacher(sol, data):
+def show_by_teacher(sol, model):
+    """model: Model do dataset, para ir da aula à UC e ao docente."""
     print("\n== HORÁRIO POR DOCENTE ==")
-    uc_to_teacher = data["uc_to_teacher"]
     teacher_vars = defaultdict(list)
     for var, (slot, room, mode) in sol.items():
-        uc = var.split("_")[0]
-        t = uc_to_teacher[uc]
+        uc = model.lesson_uc[var]
+        t = model.teachers[model.uc_teacher[model.uc_id[uc]]]
         teacher_vars[t].append((slot, uc, room, mode))
     for t, items in teacher_vars.items():
         print(f"\nDOCENTE {t}")
@@ -396,93 +869,738 @@ def show_by_teacher(sol, data):
             if row:
                 print(d, "→", ", ".join([f"{s}: {uc} @{room} ({mode})" for (s, uc, room, mode) in row]))
 
-# ---- Timeout utilitário (Unix-like) ----
-class Timeout(Exception): pass
-
-def _handle_timeout(signum, frame):
-    raise Timeout()
-
-def run_with_timeout(fn, seconds):
-    old = signal.signal(signal.SIGALRM, _handle_timeout)
-    signal.alarm(max(1, int(seconds)))
-    try:
-        return fn()
-    finally:
-        signal.alarm(0)
-        signal.signal(signal.SIGALRM, old)
+# ---- Polimento por pesquisa local ----
+def polish_local_search(sol, by_class, data, kwargs, soft_max3, seconds,
+                        max_iters=200000, seed=None, stats=None, model=None):
+    """
+    Corre LocalSearch a partir de `sol` com as mesmas hard constraints do nível
+    (kwargs de build_problem). Devolve (melhor_solução, melhor_score).
+    Com `stats` (SearchStats), junta as melhorias ao score_history.
+    """
+    busy_rooms = kwargs.get("busy_rooms", ())
+    var_infos = compute_var_infos(data, base_rooms=kwargs.get("base_rooms", BASE_ROOMS),
+                                  split_week=kwargs.get("split_week", False), model=model, busy_rooms=busy_rooms)
+    pairs = [(f"{uc}_1", f"{uc}_2") for uc in data["UCs"]]
+    scorer = DeltaScorer(sol, by_class, data, soft_max3=soft_max3)
+    ls = LocalSearch(var_infos, pairs, slot_day, scorer,
+                     rooms=not kwargs.get("test_ignore_rooms", False),
+                     max3=kwargs.get("enforce_max3_per_day", True) and not kwargs.get("test_ignore_max3", False),
+                     online_same_day=kwargs.get("enforce_online_same_day", True),
+                     busy_rooms=busy_rooms, seed=seed)
+    offset = stats.elapsed() if stats is not None else 0.0
+    best, best_score, history = ls.run(seconds=seconds, max_iters=max_iters)
+    if stats is not None:
+        for t, sc in history[1:]:
+            stats.on_score(sc, at=offset + t)
+    print(f" - Pesquisa local: score {history[0][1]} → {best_score} "
+          f"({len(history) - 1} melhorias; última aos {history[-1][0]:.2f}s).")
+    return best, best_score
 
 # ---- Estratégia em cascata com time budget ----
-def try_solve_with_budget(data, total_seconds=60.0):
+def solve_layer(data, kwargs, soft_max3, seconds, backend="bitset", polish="enum",
+                seed=None, max_nodes=None, nogoods=None, compiled=None, cache=None, precheck=None):
     """
-    Várias tentativas com restrições diferentes e timeout.
+    Um nível com orçamento (prazo + nós): 1.ª solução e polimento (polish:
+    "enum", "local" ou "bnb"). Devolve (solucao, score, by_class, stats), com
+    solucao None se falhar; stats inclui "timed_out", "optimal" e "precheck".
+    precheck: motivos já calculados por precheck_layer (None: calcula aqui).
+    compiled: CompiledModel partilhado pelos níveis (arranque a quente).
+    cache: SolutionCache; um resultado provado devolve-se logo, um incumbente
+    é o ponto de partida do polimento pedido (floor do "bnb", melhor inicial
+    do "enum", solução inicial do "local").
+    """
+    budget = Budget(seconds, max_nodes)
+    stats = SearchStats()
+    model = compiled.model if compiled is not None else None
+    problem = None
+
+    def with_rooms(sol):
+        # room_matching: as salas base só são escolhidas aqui, slot a slot
+        if sol is None or not kwargs.get("room_matching", False):
+            return sol
+        return assign_rooms(sol, data, dict.fromkeys(sol, kwargs), kwargs.get("busy_rooms", ()))
+
+    reasons = precheck if precheck is not None else precheck_layer(data, kwargs, model=model)
+    cached = cache.get(data, kwargs, soft_max3) if cache is not None and not reasons else None
+    incumbent = cached if cached is not None and cached["solution"] is not None else None
+
+    def finish(best, best_score, by_class, optimal=False, infeasible=False, store=True):
+        # infeasible: a pesquisa terminou dentro do orçamento sem nenhuma solução
+        if compiled is not None:
+            compiled.remember(best or getattr(problem, "partial", None))
+        roomed = with_rooms(best)
+        if best is not None and roomed is None:
+            # nunca devolver um score sem a solução que o obteve
+            print(" - As salas base livres não chegam para a melhor solução; nível sem solução.")
+            best_score, optimal = None, False
+        best = roomed
+        if cache is not None and store and (best is not None or infeasible):
+            cache.put(data, kwargs, soft_max3, best, best_score, by_class, optimal or infeasible)
+        out = stats.to_dict()
+        out["timed_out"] = budget.exhausted
+        out["optimal"] = optimal
+        out["precheck"] = reasons
+        return best, best_score, by_class, out
+
+    if reasons:
+        print(" - Este nível é inviável (precheck):")
+        for r in reasons:
+            print(f"   · {r}")
+        return finish(None, None, None)
+
+    if cached is not None and cached["optimal"]:
+        if incumbent is None:
+            print(" - Em cache: já se provou que este nível não tem solução.")
+            return finish(None, None, None, store=False)
+        print(f" - Em cache: solução ótima (score={cached['score']}).")
+        stats.on_score(cached["score"])
+        return finish(incumbent["solution"], cached["score"], cached["by_class"], optimal=True, store=False)
+    if incumbent is not None:
+        print(f" - Em cache: incumbente com score={incumbent['score']}; a continuar a partir dele.")
+        if compiled is not None:
+            compiled.remember(incumbent["solution"])
+        if polish == "local":
+            # a pesquisa local parte do incumbente em vez de uma 1.ª solução nova
+            best, best_score, by_class = incumbent["solution"], incumbent["score"], incumbent["by_class"]
+            stats.on_score(best_score)
+            start = with_rooms(best)
+            if start is not None and budget.remaining() >= 0.1:
+                best, best_score = polish_local_search(start, by_class, data, kwargs, soft_max3,
+                                                       budget.remaining(), seed=seed, stats=stats, model=model)
+            return finish(best, best_score, by_class)
+
+    if polish == "bnb":
+        backend = "bitset"
+    build = build_problem(data, backend=backend, nogoods=nogoods, compiled=compiled, **kwargs)
+    if build == (None, None, None):
+        print(" - Este nível está inviável à partida (domínios a 0 ou capacidade insuficiente).")
+        return finish(None, None, None)
+
+    problem, by_class, _ = build
+    set_budget(problem, budget)
+    set_stats(problem, stats)
+
+    if polish == "bnb":
+        best = best_score = None
+        if incumbent is not None:
+            best, best_score = incumbent["solution"], incumbent["score"]
+            stats.on_score(best_score)
+        search = problem.optimize(soft_max3=soft_max3, floor=best_score)
+        first = next(search, None)
+        if first:
+            best, best_score = first
+            stats.on_score(best_score)
+            start = with_rooms(best)
+            if start is not None and budget.remaining() >= 0.2:
+                ls, ls_score = polish_local_search(start, by_class, data, kwargs, soft_max3,
+                                                   budget.remaining() / 4, seed=seed, stats=stats, model=model)
+                if ls_score > best_score:
+                    best, best_score = ls, ls_score
+                    problem.tighten(best_score)
+            for sol, sc in search:
+                best, best_score = sol, sc
+                stats.on_score(best_score)
+        optimal = best is not None and problem.proven_optimal
+        if best is None:
+            if budget.exhausted:
+                print(" - Orçamento esgotado nesta tentativa (sem 1.ª solução).")
+        elif optimal:
+            print(f" - Branch-and-bound terminou; score={best_score} é ótimo.")
+        else:
+            print(f" - Branch-and-bound parado no limite; melhor score={best_score}.")
+        return finish(best, best_score, by_class, optimal, infeasible=best is None and problem.proven_optimal)
+
+    # 1) 1.ª solução (o mesmo iterador continua a ser usado no polimento)
+    solutions = problem.getSolutionIter()
+    sol = next(solutions, None)
+    if not sol:
+        if budget.exhausted:
+            print(" - Orçamento esgotado nesta tentativa (sem 1.ª solução).")
+        return finish(None, None, by_class, infeasible=not budget.exhausted)
+
+    # 2) polimento com o orçamento residual
+    best, best_score = sol, score_solution(sol, by_class, data, soft_max3=soft_max3)
+    if incumbent is not None and incumbent["score"] >= best_score:
+        best, best_score = incumbent["solution"], incumbent["score"]
+    stats.on_score(best_score)
+    if polish == "local":
+        start = with_rooms(best)
+        if start is not None and budget.remaining() >= 0.1:
+            best, best_score = polish_local_search(start, by_class, data, kwargs, soft_max3,
+                                                   budget.remaining(), seed=seed, stats=stats, model=model)
+    else:
+        for s, sc in score_stream(solutions, best, by_class, data, soft_max3=soft_max3):
+            if sc > best_score:
+                best, best_score = s, sc
+                stats.on_score(best_score)
+        if budget.exhausted:
+            print(f" - Polido até ao limite; melhor score={best_score}.")
+        else:
+            print(f" - Todas as soluções vistas; melhor score={best_score}.")
+            return finish(best, best_score, by_class, optimal=True)
+
+    return finish(best, best_score, by_class)
+
+def try_solve_with_budget(data, total_seconds=60.0, backend="bitset", polish="enum",
+                          max_nodes=None, stats_out=None, profile_dir=None, compiled=None, report=None,
+                          cache=None, layers=None):
+    """
+    Cascata de `layers` (por omissão LAYERS), com o orçamento repartido pelos
+    níveis que passam o precheck (os outros são saltados) e um CompiledModel
+    partilhado.
+    backend: o "bitset" é o único que segue o var_order/val_order de cada nível.
+    stats_out: ficheiro JSONL de estatísticas por nível ("-": stdout).
+    profile_dir: grava aí o cProfile de cada nível (layer<i>.prof).
+    report: dict que recebe layer, desc, score e stats do nível vencedor.
     Devolve (solucao, by_class, soft_max3).
     """
-    layers = [
-        ("Modelo completo",
-         dict(enforce_online_same_day=True,  enforce_max3_per_day=True,  base_rooms=("SalaA","SalaB"), split_week=False, test_ignore_rooms=False, test_ignore_max3=False),
-         False),
-        ("Sem online_same_day",
-         dict(enforce_online_same_day=False, enforce_max3_per_day=True,  base_rooms=("SalaA","SalaB"), split_week=False, test_ignore_rooms=False, test_ignore_max3=False),
-         False),
-        ("Menos salas (1 sala base)",
-         dict(enforce_online_same_day=False, enforce_max3_per_day=True,  base_rooms=("SalaA",),       split_week=False, test_ignore_rooms=False, test_ignore_max3=False),
-         False),
-        ("Split semana (_1 1ª metade; _2 2ª)",
-         dict(enforce_online_same_day=False, enforce_max3_per_day=True,  base_rooms=("SalaA",),       split_week=True,  test_ignore_rooms=False, test_ignore_max3=False),
-         False),
-        ("Sem max3_por_dia como hard (fica soft)",
-         dict(enforce_online_same_day=False, enforce_max3_per_day=False, base_rooms=("SalaA",),       split_week=True,  test_ignore_rooms=False, test_ignore_max3=False),
-         True),
-        ("TESTE: ignorar rooms e max3 (viabilidade estrutural)",
-         dict(enforce_online_same_day=False, enforce_max3_per_day=False, base_rooms=("SalaA","SalaB"), split_week=False, test_ignore_rooms=True,  test_ignore_max3=True),
-         True),
-    ]
-
-    per_try = max(1.5, total_seconds / len(layers))
-
-    for desc, kwargs, soft_max3 in layers:
-        print(f"\n[TRY] {desc} (timeout ~{per_try:.1f}s)")
-        build = build_problem(data, **kwargs)
-        if build == (None, None, None):
-            print(" - Este nível está inviável à partida (domínios a 0 ou capacidade insuficiente).")
+    layers = LAYERS if layers is None else layers
+    compiled = compiled or CompiledModel(data)
+    rejected = {idx: precheck_layer(data, kwargs, model=compiled.model)
+                for idx, (_, kwargs, _) in enumerate(layers)}
+    viable = sum(1 for r in rejected.values() if not r)
+    per_try = max(1.5, total_seconds / max(1, viable))
+    nogoods = compiled.nogoods if backend == "bitset" or polish == "bnb" else None
+    if backend == "constraint" and polish != "bnb" and any("var_order" in kw or "val_order" in kw
+                                                          for _, kw, _ in layers):
+        print("[AVISO] O backend \"constraint\" ignora o var_order/val_order dos níveis (usa sempre MRV+grau).")
+
+    for idx, (desc, kwargs, soft_max3) in enumerate(layers):
+        if rejected[idx]:
+            print(f"\n[TRY] {desc} — saltado, inviável (precheck): {'; '.join(rejected[idx])}")
+            if stats_out:
+                emit_layer_stats(stats_out, dict(layer=idx, desc=desc, backend=backend, polish=polish,
+                                                 kwargs=kwargs, found=False, score=None,
+                                                 precheck=rejected[idx]))
             continue
-
-        problem, by_class, _ = build
-
-        # 1) tenta 1.ª solução rápida
-        start = time.time()
+        print(f"\n[TRY] {desc} (orçamento ~{per_try:.1f}s)")
+        profiler = None
+        if profile_dir:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
         try:
-            sol = run_with_timeout(problem.getSolution, per_try)
-        except Timeout:
-            print(" - Timeout nesta tentativa (sem 1.ª solução).")
-            sol = None
+            best, score, by_class, stats = solve_layer(data, kwargs, soft_max3, per_try, backend=backend,
+                                                       polish=polish, max_nodes=max_nodes, nogoods=nogoods,
+                                                       compiled=compiled, cache=cache, precheck=rejected[idx])
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                pathlib.Path(profile_dir).mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(str(pathlib.Path(profile_dir) / f"layer{idx}.prof"))
+        if stats_out:
+            emit_layer_stats(stats_out, dict(layer=idx, desc=desc, backend=backend, polish=polish,
+                                             kwargs=kwargs, found=best is not None, score=score, **stats))
+        if best:
+            if report is not None:
+                report.update(layer=idx, desc=desc, score=score, stats=stats)
+            return best, by_class, soft_max3
 
-        if not sol:
-            continue
+    return None, None, False
 
-        # 2) polimento com tempo residual
-        leftover = max(0.0, per_try - (time.time() - start))
-        best, best_score = sol, score_solution(sol, by_class, data, soft_max3=soft_max3)
-        if leftover >= 0.5:
-            def improve():
-                nonlocal best, best_score
-                deadline = time.time() + leftover
-                for s in problem.getSolutionIter():
-                    sc = score_solution(s, by_class, data, soft_max3=soft_max3)
-                    if sc > best_score:
-                        best, best_score = s, sc
-                    if time.time() > deadline:
-                        break
-                return best, best_score
+def emit_layer_stats(stats_out, record):
+    """Escreve `record` como uma linha JSON em stats_out (caminho, ou "-" para stdout)."""
+    line = json.dumps(record, ensure_ascii=False, default=list)
+    if stats_out == "-":
+        print(line)
+    else:
+        with open(stats_out, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+# ---- Portfólio paralelo (um processo por nível/variante) ----
+def wave_budget(total_seconds, n_jobs, workers):
+    """Orçamento por tarefa: com mais tarefas do que processos, correm em ceil(n/workers) vagas."""
+    waves = max(1, -(-n_jobs // workers))
+    return max(1.5, total_seconds / waves)
+
+def _portfolio_job(job):
+    data, layer_idx, variant, seconds = job
+    desc, kwargs, soft_max3 = LAYERS[layer_idx]
+    for key in ("var_order", "val_order"):
+        if key in variant:
+            kwargs = dict(kwargs, **{key: variant[key]})
+    best, score, by_class, _ = solve_layer(data, kwargs, soft_max3, seconds,
+                                           backend=variant.get("backend", "bitset"),
+                                           polish=variant.get("polish", "enum"),
+                                           seed=variant.get("seed"),
+                                           max_nodes=variant.get("max_nodes"))
+    return layer_idx, variant, best, score, by_class
+
+def try_solve_portfolio(data, total_seconds=60.0, workers=None, variants=None):
+    """
+    Corre os níveis de LAYERS (e, opcionalmente, várias variantes por nível:
+    dicts com "backend", "polish", "seed", "max_nodes", "var_order" e
+    "val_order") num pool de processos.
+    Devolve o resultado do nível mais restrito que tiver solução, logo que todos
+    os níveis mais restritos tenham falhado, e termina os restantes processos.
+    Mesmo formato de try_solve_with_budget: (solucao, by_class, soft_max3).
+    """
+    import multiprocessing as mp
+
+    variants = variants or [{"backend": "bitset"}]
+    workers = workers or mp.cpu_count()
+    jobs = [(data, i, v) for i in range(len(LAYERS)) for v in variants]
+    per_job = wave_budget(total_seconds, len(jobs), workers)
+    jobs = [(d, i, v, per_job) for (d, i, v) in jobs]
+
+    pending = defaultdict(int)          # nível -> variantes ainda a correr
+    for _, i, _, _ in jobs:
+        pending[i] += 1
+    found = {}                          # nível -> (score, solucao, by_class)
+
+    def decided():
+        # o nível i ganha quando tem solução e todas as suas variantes e as dos
+        # níveis mais restritos já terminaram
+        for i in range(len(LAYERS)):
+            if pending[i]:
+                return None
+            if i in found:
+                return i
+        return -1
+
+    print(f"\n[PORTFOLIO] {len(jobs)} tarefas em {workers} processos (~{per_job:.1f}s cada)")
+    deadline = time.monotonic() + total_seconds + 5.0
+    pool = mp.Pool(workers)
+    try:
+        results = pool.imap_unordered(_portfolio_job, jobs)
+        while decided() is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
             try:
-                best, best_score = run_with_timeout(improve, leftover)
-                print(f" - Polido; melhor score={best_score}.")
-            except Timeout:
-                print(f" - Polido até ao limite; melhor score={best_score}.")
+                layer_idx, variant, best, score, by_class = results.next(timeout=remaining)
+            except mp.TimeoutError:
+                break
+            except StopIteration:
+                break
+            pending[layer_idx] -= 1
+            if best and (layer_idx not in found or score > found[layer_idx][0]):
+                found[layer_idx] = (score, best, by_class)
+                print(f" - {LAYERS[layer_idx][0]} ({variant}): score={score}")
+    finally:
+        pool.terminate()
+        pool.join()
+
+    if not found:
+        return None, None, False
+    best_layer = min(found)
+    score, best, by_class = found[best_layer]
+    print(f"[PORTFOLIO] Nível escolhido: {LAYERS[best_layer][0]} (score={score})")
+    return best, by_class, LAYERS[best_layer][2]
+
+# ---- Decomposição em componentes independentes ----
+def find_components(data):
+    """
+    Componentes ligadas do grafo UCs–docentes–turmas–salas obrigatórias (#rr):
+    duas UCs ficam no mesmo componente se partilham docente, turma ou sala fixa.
+    As salas base não ligam nada (são repartidas no fim por assign_rooms).
+    Devolve listas de UCs, da maior para a menor.
+    """
+    parent = {uc: uc for uc in data["UCs"]}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    first = {}
+    for uc in data["UCs"]:
+        keys = (("teacher", data["uc_to_teacher"].get(uc)),
+                ("class", data["uc_to_class"].get(uc)),
+                ("room", data["uc_room_required"].get(uc)))
+        for key in keys:
+            if key[1] is None:
+                continue
+            if key in first:
+                parent[find(uc)] = find(first[key])
+            else:
+                first[key] = uc
 
-        return best, by_class, soft_max3
+    groups = defaultdict(list)
+    for uc in data["UCs"]:
+        groups[find(uc)].append(uc)
+    return sorted(groups.values(), key=len, reverse=True)
 
-    return None, None, False
+def sub_dataset(data, ucs):
+    """Recorte do dataset (mesmo formato de load_dataset) só com estas UCs."""
+    ucs = set(ucs)
+    teachers = {data["uc_to_teacher"][uc] for uc in ucs}
+    return {
+        "class_to_ucs": {c: [u for u in us if u in ucs]
+                         for c, us in data["class_to_ucs"].items() if any(u in ucs for u in us)},
+        "teacher_to_ucs": {t: [u for u in us if u in ucs]
+                           for t, us in data["teacher_to_ucs"].items() if t in teachers},
+        "teacher_unavail": {t: s for t, s in data["teacher_unavail"].items() if t in teachers},
+        "uc_room_required": {u: r for u, r in data["uc_room_required"].items() if u in ucs},
+        "uc_online_idx": defaultdict(set, {u: i for u, i in data["uc_online_idx"].items() if u in ucs}),
+        "uc_to_class": {u: c for u, c in data["uc_to_class"].items() if u in ucs},
+        "uc_to_teacher": {u: t for u, t in data["uc_to_teacher"].items() if u in ucs},
+        "UCs": [u for u in data["UCs"] if u in ucs],
+    }
+
+def assign_rooms(sol, data, layer_kwargs, busy_rooms=()):
+    """
+    Reparte as salas slot a slot por emparelhamento bipartido: cada aula presencial
+    fica com uma sala que pode usar (a do #rr ou uma das base_rooms do seu nível),
+    sem duas aulas na mesma sala e slot nem salas de busy_rooms (pares (slot, sala)).
+    layer_kwargs: aula -> kwargs do nível em que foi resolvida (os níveis com
+    test_ignore_rooms ficam de fora).
+    Devolve a solução com as salas reatribuídas, ou None se algum slot não couber.
+    """
+    by_slot = defaultdict(dict)
+    for v, (s, r, m) in sol.items():
+        kwargs = layer_kwargs[v]
+        if m != "presencial" or kwargs.get("test_ignore_rooms", False):
+            continue
+        req = data["uc_room_required"].get(v.rsplit("_", 1)[0])
+        rooms = {req} if req else set(kwargs.get("base_rooms", BASE_ROOMS))
+        by_slot[s][v] = {r for r in rooms if (s, r) not in busy_rooms}
+
+    out = dict(sol)
+    for s, domains in by_slot.items():
+        rooms = assign_by_matching(domains)
+        if rooms is None:
+            return None
+        for v, r in rooms.items():
+            out[v] = (s, r, "presencial")
+    return out
+
+def _room_clash(sol, busy=()):
+    """True se alguma aula presencial de `sol` usa um (slot, sala) de `busy` ou de outra aula."""
+    seen = set(busy)
+    for s, r, m in sol.values():
+        if m == "presencial":
+            if (s, r) in seen:
+                return True
+            seen.add((s, r))
+    return False
+
+def _component_job(job):
+    # a cascata de LAYERS no recorte, com as salas de busy_rooms tiradas a todos os níveis
+    sub, seconds, backend, polish, busy_rooms, cache = job
+    layers = [(desc, dict(kwargs, busy_rooms=busy_rooms) if busy_rooms else kwargs, soft_max3)
+              for desc, kwargs, soft_max3 in LAYERS]
+    print(f"\n[COMPONENTE] UCs {sub['UCs'][0]}.. ({len(sub['UCs'])})")
+    report = {}
+    best, by_class, _ = try_solve_with_budget(sub, total_seconds=seconds, backend=backend, polish=polish,
+                                              report=report, cache=cache, layers=layers)
+    return report.get("layer"), best, by_class
+
+def try_solve_components(data, total_seconds=60.0, workers=None, backend="bitset", polish="enum",
+                         compiled=None, cache=None):
+    """
+    Resolve cada componente de find_components à parte (em paralelo, um processo
+    por componente) com a cascata de LAYERS, junta os horários e reparte as salas
+    base no fim (assign_rooms). Se as salas partilhadas não couberem, repara
+    componente a componente: cada um fica com as salas que os anteriores deixaram
+    livres e, se não couber, volta a ser resolvido só com essas. Em último caso
+    resolve o modelo inteiro com o tempo que sobrar. Com um só componente é igual
+    a try_solve_with_budget. Mesmo formato de retorno: (solucao, by_class, soft_max3).
+    compiled: CompiledModel do dataset inteiro, usado quando este é resolvido de uma vez.
+    cache: SolutionCache; cada componente tem as suas entradas (a chave é o recorte do dataset).
+    """
+    import multiprocessing as mp
+
+    comps = find_components(data)
+    if len(comps) < 2:
+        return try_solve_with_budget(data, total_seconds=total_seconds, backend=backend, polish=polish,
+                                     compiled=compiled, cache=cache)
+
+    start = time.monotonic()
+    workers = min(workers or mp.cpu_count(), len(comps))
+    per_job = wave_budget(total_seconds, len(comps), workers)
+    jobs = [(sub_dataset(data, ucs), per_job, backend, polish, frozenset(), cache) for ucs in comps]
+    print(f"\n[COMPONENTES] {len(comps)} componentes independentes ({[len(c) for c in comps]} UCs) "
+          f"em {workers} processos")
+    if workers > 1:
+        with mp.Pool(workers) as pool:
+            results = pool.map(_component_job, jobs)
+    else:
+        results = [_component_job(job) for job in jobs]
+
+    sol, layer_kwargs = {}, {}
+    for ucs, (idx, best, bc) in zip(comps, results):
+        if best is None:
+            print(f"[COMPONENTES] Sem solução para o componente com {ucs} (logo, nem para o todo).")
+            return None, None, False
+        print(f"[COMPONENTES] {len(ucs)} UCs resolvidas no nível: {LAYERS[idx][0]}")
+        sol.update(best)
+        layer_kwargs.update(dict.fromkeys(best, LAYERS[idx][1]))
+
+    merged = assign_rooms(sol, data, layer_kwargs)
+    if merged is not None and _room_clash(merged):
+        merged = None   # algum componente veio de um nível que ignora salas (TESTE)
+    if merged is None:
+        print("[COMPONENTES] As salas base não chegam para juntar os horários; a reparar componente a componente.")
+        busy = set()
+        for n, (job, (idx, best, bc)) in enumerate(zip(jobs, results)):
+            part = assign_rooms(best, data, dict.fromkeys(best, LAYERS[idx][1]), busy)
+            if part is None or _room_clash(part, busy):
+                left = total_seconds - (time.monotonic() - start)
+                idx, best, bc = _component_job(job[:1] + (max(1.5, left / (len(jobs) - n)),) + job[2:4]
+                                               + (frozenset(busy), cache))
+                part = best and assign_rooms(best, data, dict.fromkeys(best, LAYERS[idx][1]), busy)
+                if not part or _room_clash(part, busy):
+                    left = total_seconds - (time.monotonic() - start)
+                    print("[COMPONENTES] A reparação falhou; a resolver o modelo inteiro.")
+                    return try_solve_with_budget(data, total_seconds=max(1.5 * len(LAYERS), left),
+                                                 backend=backend, polish=polish, compiled=compiled, cache=cache)
+                results[n] = (idx, best, bc)
+            busy |= {(s, r) for (s, r, m) in part.values() if m == "presencial"}
+            sol.update(part)
+        merged = sol
+
+    by_class, soft_max3 = {}, False
+    for idx, best, bc in results:
+        by_class.update(bc)
+        soft_max3 = soft_max3 or LAYERS[idx][2]
+    return merged, by_class, soft_max3
+
+# ---- Reparação a partir de uma solução anterior ----
+def still_valid(prev, data, kwargs, model=None):
+    """
+    Aulas de `prev` que continuam possíveis no dataset (novo) `data` com as hard
+    constraints do nível `kwargs`: o valor ainda está no domínio (#tr, #rr, salas)
+    e não choca com as aulas já mantidas (guloso, pela ordem das UCs).
+    Devolve (mantidas, invalidadas), duas listas de nomes de aulas.
+    """
+    model = model or Model(data, SLOTS, kwargs.get("base_rooms", BASE_ROOMS))
+    lessons, _ = model.layer(kwargs.get("base_rooms", BASE_ROOMS), kwargs.get("split_week", False),
+                             kwargs.get("busy_rooms", ()), room_matching=False)
+    rooms = not kwargs.get("test_ignore_rooms", False)
+    max3 = kwargs.get("enforce_max3_per_day", True) and not kwargs.get("test_ignore_max3", False)
+    online_same_day = kwargs.get("enforce_online_same_day", True)
+
+    kept, broken = [], []
+    taken = set()                  # ("t", docente, slot), ("c", turma, slot), ("r", slot, sala)
+    per_day = defaultdict(int)     # (turma, dia) -> aulas
+    placed = {}                    # aula mantida -> valor
+    for l in lessons:
+        name, val = model.name(l), prev.get(model.name(l))
+        v = model.encode_value(l, val) if val is not None else None
+        if v is None or v not in l.domain:
+            broken.append(name)
+            continue
+        s, r, m = val
+        keys = [("t", l.teacher, s), ("c", l.turma, s)]
+        if rooms and l.inperson:
+            keys.append(("r", s, r))
+        ok = not any(k in taken for k in keys)
+        ok = ok and not (max3 and per_day[(l.turma, slot_day(s))] >= 3)
+        sibling = placed.get(f"{model.ucs[l.uc]}_1") if l.part == 2 else None
+        if ok and sibling is not None:
+            ok = sibling[0] < s and not (online_same_day and m == "online" and sibling[2] == "online"
+                                         and slot_day(sibling[0]) != slot_day(s))
+        if not ok:
+            broken.append(name)
+            continue
+        taken.update(keys)
+        per_day[(l.turma, slot_day(s))] += 1
+        placed[name] = val
+        kept.append(name)
+    return kept, broken
+
+def direct_conflicts(names, prev, data):
+    """
+    Aulas de `prev` em conflito direto com `names`: a outra aula da mesma UC
+    e as que estão no mesmo slot com o mesmo docente, a mesma turma ou a mesma sala.
+    """
+    def keys(v):
+        uc = v.rsplit("_", 1)[0]
+        s, r, m = prev[v]
+        out = [("t", data["uc_to_teacher"][uc], s), ("c", data["uc_to_class"][uc], s)]
+        if m == "presencial":
+            out.append(("r", r, s))
+        return out
+
+    names = [v for v in names if v in prev]
+    hit = {k for v in names for k in keys(v)}
+    siblings = {f"{v.rsplit('_', 1)[0]}_{i}" for v in names for i in (1, 2)}
+    return set(names) | (siblings & set(prev)) | {w for w in prev if any(k in hit for k in keys(w))}
+
+def neighbourhood(names, data, radius=1):
+    """
+    Aulas a até `radius` passos de `names`, em que um passo liga aulas da mesma
+    UC, do mesmo docente, da mesma turma ou com a mesma sala obrigatória (#rr).
+    """
+    groups = defaultdict(list)
+    for uc in data["UCs"]:
+        lessons = (f"{uc}_1", f"{uc}_2")
+        keys = [("uc", uc), ("t", data["uc_to_teacher"][uc]), ("c", data["uc_to_class"][uc])]
+        if uc in data["uc_room_required"]:
+            keys.append(("r", data["uc_room_required"][uc]))
+        for key in keys:
+            groups[key].extend(lessons)
+    keys_of = defaultdict(list)
+    for key, members in groups.items():
+        for v in members:
+            keys_of[v].append(key)
+
+    seen, frontier = set(names), set(names)
+    for _ in range(radius):
+        nxt = {w for v in frontier for key in keys_of[v] for w in groups[key]} - seen
+        seen |= nxt
+        frontier = nxt
+    return seen
+
+def repair_solution(prev, data, seconds=10.0, kwargs=None, backend="bitset"):
+    """
+    Arranque a quente depois de uma pequena alteração ao dataset (um #tr novo,
+    uma UC que passa a Lab01, ...): mantém as aulas de `prev` que continuam
+    válidas (still_valid) e volta a resolver só as invalidadas e a sua
+    vizinhança, com os valores
+    antigos como primeira escolha. A vizinhança começa nas aulas em conflito
+    direto com as invalidadas (direct_conflicts) e só alarga se a reparação
+    falhar: raio 1 e 2 de neighbourhood, depois tudo. As salas são escolhidas
+    na pesquisa (sem room_matching), para que as aulas mantidas fiquem na
+    mesma sala.
+    kwargs: nível de LAYERS a respeitar (por omissão, o modelo completo).
+    Devolve (solucao, by_class, alteradas), com alteradas = aulas que mudaram
+    de valor; solucao é None se nem resolvendo tudo houver solução no tempo dado.
+    """
+    kwargs = dict(LAYERS[0][1] if kwargs is None else kwargs, room_matching=False)
+    deadline = time.monotonic() + seconds
+    compiled = CompiledModel(data)
+    compiled.remember(prev)
+    kept, broken = still_valid(prev, data, kwargs, model=compiled.model)
+    print(f"[REPARAR] {len(kept)} aulas continuam válidas, {len(broken)} invalidadas.")
+    if not broken:
+        sol = {v: prev[v] for v in kept}
+        by_class = defaultdict(list)
+        for uc in data["UCs"]:
+            by_class[data["uc_to_class"][uc]] += [f"{uc}_1", f"{uc}_2"]
+        return sol, by_class, []
+
+    steps = (0, 1, 2, None)
+    for n, radius in enumerate(steps):
+        if radius == 0:
+            free = direct_conflicts(broken, prev, data) | set(broken)
+        else:
+            free = neighbourhood(broken, data, radius) if radius is not None else set(kept) | set(broken)
+        fixed = {v: prev[v] for v in kept if v not in free}
+        label = "conflitos diretos" if radius == 0 else f"raio {radius}" if radius else "tudo"
+        print(f"[REPARAR] Vizinhança ({label}): {len(free)} aulas livres, {len(fixed)} fixas.")
+        build = build_problem(data, backend=backend, compiled=compiled, fixed=fixed, **kwargs)
+        if build == (None, None, None):
+            continue
+        problem, by_class, _ = build
+        left = deadline - time.monotonic()
+        budget = Budget(max(0.1, left / (len(steps) - n)))
+        set_budget(problem, budget)
+        sol = problem.getSolution()
+        if sol:
+            changed = sorted(v for v in sol if prev.get(v) != sol[v])
+            print(f"[REPARAR] Solução com {len(changed)} aulas alteradas.")
+            return sol, by_class, changed
+    return None, None, None
+
+# ---- Explicação de inviabilidade (QuickXplain) ----
+def constraint_groups(data, kwargs):
+    """
+    Grupos de restrições hard do nível `kwargs` que o diagnóstico pode ligar e
+    desligar: chave -> descrição. As indisponibilidades (#tr) e as salas (#rr e
+    salas base) contam como grupos; a ordem _1 antes de _2 fica sempre ligada.
+    """
+    groups = {}
+    for t, bad in sorted(data["teacher_unavail"].items()):
+        if bad:
+            groups[("tr", t)] = f"indisponibilidades (#tr) de {t}"
+    for t in sorted(set(data["uc_to_teacher"].values())):
+        groups[("teacher", t)] = f"docente {t}: uma aula por slot"
+    for c in sorted(set(data["uc_to_class"].values())):
+        groups[("class", c)] = f"turma {c}: uma aula por slot"
+        if kwargs.get("enforce_max3_per_day", True) and not kwargs.get("test_ignore_max3", False):
+            groups[("max3", c)] = f"turma {c}: máx. 3 aulas por dia"
+    if not kwargs.get("test_ignore_rooms", False):
+        for r in sorted(set(data["uc_room_required"].values())):
+            groups[("room", r)] = f"sala {r} (#rr): uma aula por slot"
+        base_rooms = kwargs.get("base_rooms", BASE_ROOMS)
+        groups[("base",)] = f"salas base {'/'.join(base_rooms)}: capacidade por slot"
+    if kwargs.get("enforce_online_same_day", True):
+        for uc in data["UCs"]:
+            if len(data["uc_online_idx"].get(uc, ())) == 2:
+                groups[("online", uc)] = f"{uc}: aulas online no mesmo dia"
+    return groups
+
+def groups_consistent(data, kwargs, groups, seconds=1.0, max_nodes=None):
+    """
+    Resolve (com orçamento) o nível `kwargs` só com os grupos de restrições dados.
+    Devolve True (há solução), False (provado que não há) ou None (orçamento esgotado).
+    """
+    groups = set(groups)
+    base_rooms = kwargs.get("base_rooms", BASE_ROOMS)
+    relaxed = dict(data, teacher_unavail={t: bad for t, bad in data["teacher_unavail"].items()
+                                          if ("tr", t) in groups})
+    var_infos, pool_capacity = layer_var_infos(relaxed, base_rooms, kwargs.get("split_week", False),
+                                               kwargs.get("busy_rooms", ()), room_matching=True)
+    if any(not vi["domain"] for vi in var_infos):
+        return False
+    # os casos de Hall (docente/turma/sala) provam-se em tempo polinomial, sem pesquisa
+    if _slot_conflicts(var_infos, {t for (kind, *rest) in groups if kind == "teacher" for t in rest},
+                       {c for (kind, *rest) in groups if kind == "class" for c in rest},
+                       {c for (kind, *rest) in groups if kind == "max3" for c in rest}):
+        return False
+
+    # e as das salas também: cada sala #rr e as salas base (com a capacidade por slot)
+    domains = {vi["name"]: vi["domain"] for vi in var_infos}
+    by_room, pool_vars = defaultdict(list), []
+    for vi in var_infos:
+        if vi["inperson"]:
+            by_room[vi["domain"][0][1]].append(vi["name"])
+        if vi["pool"]:
+            pool_vars.append(vi["name"])
+    for r, vs in by_room.items():
+        if ("room", r) in groups and assign_by_matching({v: {val[0] for val in domains[v]} for v in vs}) is None:
+            return False
+    if pool_vars and ("base",) in groups:
+        if assign_by_matching({v: {(val[0], k) for val in domains[v] for k in range(pool_capacity[val[0]])}
+                               for v in pool_vars}) is None:
+            return False
+
+    build = build_problem(relaxed, **dict(kwargs, room_matching=True, backend="constraint"), groups=groups)
+    if build == (None, None, None):
+        return False
+    problem, _, _ = build
+    budget = Budget(seconds, max_nodes)
+    set_budget(problem, budget)
+    if problem.getSolution():
+        return True
+    return None if budget.exhausted else False
+
+def explain_infeasibility(data, kwargs=None, seconds=20.0, per_call=1.0):
+    """
+    QuickXplain (Junker, 2004) sobre os grupos de constraint_groups: devolve um
+    conjunto mínimo de grupos que, juntos, não têm solução (lista de chaves), ou
+    None se o nível completo tiver solução ou não se conseguir provar o conflito.
+    Cada teste é uma chamada curta a groups_consistent (per_call segundos); um
+    teste que esgote o orçamento conta como "sem conflito", por isso a resposta
+    pode não ser mínima quando há chamadas inconclusivas.
+    """
+    kwargs = LAYERS[0][1] if kwargs is None else kwargs
+    groups = list(constraint_groups(data, kwargs))
+    deadline = time.monotonic() + seconds
+
+    def consistent(subset):
+        left = deadline - time.monotonic()
+        if left <= 0:
+            return True
+        return groups_consistent(data, kwargs, subset, seconds=min(per_call, left)) is not False
+
+    def qx(background, delta, candidates):
+        if delta and not consistent(background):
+            return []
+        if len(candidates) == 1:
+            return list(candidates)
+        half = len(candidates) // 2
+        c1, c2 = candidates[:half], candidates[half:]
+        d2 = qx(background + c1, c1, c2)
+        d1 = qx(background + d2, d2, c1)
+        return d1 + d2
+
+    if groups_consistent(data, kwargs, groups, seconds=max(per_call, seconds / 4)) is not False:
+        return None
+    return qx([], [], groups)
 
 # ---- MAIN ----
 def main():
@@ -492,27 +1610,35 @@ def main():
         print(f"Erro: não encontrei '{DATA_PATH}'. Coloca o ficheiro ao lado do main.py.")
         sys.exit(1)
 
+    compiled = CompiledModel(data)
     print("A correr diagnóstico rápido...")
-    run_diagnostics(data)
+    run_diagnostics(data, model=compiled.model)
 
     print("A procurar soluções com orçamento de tempo...")
     TOTAL_SECONDS = 60.0  # ajusta conforme precisares
-    sol, by_class, soft_max3 = try_solve_with_budget(data, total_seconds=TOTAL_SECONDS)
+    # branch-and-bound: prova o ótimo, e um ótimo em cache devolve-se logo na execução seguinte
+    sol, by_class, soft_max3 = try_solve_components(data, total_seconds=TOTAL_SECONDS, polish="bnb",
+                                                    compiled=compiled, cache=SolutionCache(slots=SLOTS))
 
     if not sol:
         print("\nNenhuma solução encontrada dentro do orçamento de tempo.")
-        print("DICAS: ")
-        print(" - Se o 'TESTE: ignorar rooms e max3' ENCONTRAR solução → o problema está nas salas/limite diário.")
-        print(" - Se NEM o teste encontrar solução → conflito nas indisponibilidades ou carga por docente/turma.")
-        print(" - Vê o diagnóstico acima (domínios zero e 'OK? False').")
+        print("A procurar um conjunto mínimo de restrições em conflito (modelo completo)...")
+        conflict = explain_infeasibility(data)
+        if conflict is None:
+            print(" - Não foi possível provar um conflito no tempo dado; experimenta um orçamento maior.")
+        else:
+            labels = constraint_groups(data, LAYERS[0][1])
+            print("Estas restrições, juntas, não têm solução (relaxar qualquer uma desfaz este conflito):")
+            for key in conflict:
+                print(f" - {labels[key]}")
         sys.exit(0)
 
     sc = score_solution(sol, by_class, data, soft_max3=soft_max3)
     print("\n== MELHOR SOLUÇÃO ENCONTRADA DENTRO DO TEMPO ==")
     print("Score:", sc)
-    show_by_class(sol, by_class)
-    show_by_teacher(sol, data)
+    show_by_class(sol, by_class, compiled.model)
+    show_by_teacher(sol, compiled.model)
 
-if _name_ == "_main_":
-    # Timeout via signal funciona em macOS/Linux. Usa: python -u main.py
+if __name__ == "__main__":
+    # Orçamento cooperativo (sem signal): funciona em qualquer SO/thread. Usa: python -u main.py
     main()
\ No newline at end of file
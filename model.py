@@ -0,0 +1,177 @@
+# model.py
+# Representação compacta do modelo de horários: UCs, docentes, turmas e salas
+# internados em ids inteiros, aulas em registos com __slots__ e cada valor do
+# domínio codificado num só int (slot*R + sala). A camada de descodificação
+# (name, value, var_info, decode) devolve os nomes e os tuplos (slot, sala, modo)
+# usados na impressão, na exportação e no python-constraint.
+
+from array import array
+
+POOL_ROOM = "*"          # sala base ainda por escolher (modo room_matching)
+ONLINE_ROOM = "Online"   # descodificada como Online::<UC>
+
+
+class Lesson:
+    """Uma aula (variável): ids inteiros e o domínio como array de valores codificados."""
+    __slots__ = ("id", "uc", "part", "teacher", "turma", "online", "domain", "inperson", "pool")
+
+    def __init__(self, id, uc, part, teacher, turma, online, domain, inperson, pool):
+        self.id = id
+        self.uc = uc
+        self.part = part
+        self.teacher = teacher
+        self.turma = turma
+        self.online = online
+        self.domain = domain
+        self.inperson = inperson
+        self.pool = pool
+
+
+class Model:
+    """
+    data:  dataset de load_dataset.
+    slots: universo de slots (inteiros).
+    rooms: salas base que os níveis podem usar, além das do #rr.
+    Os domínios completos (todas as salas base, sem split nem salas ocupadas)
+    calculam-se uma vez; cada nível só os filtra, e fica em cache.
+    As salas reais têm ids por ordem alfabética (depois de POOL_ROOM e
+    ONLINE_ROOM), por isso ordenar os valores codificados dá a mesma ordem que
+    ordenar os tuplos (slot, sala, modo).
+    """
+
+    def __init__(self, data, slots, rooms=()):
+        self.slots = list(slots)
+        self.ucs = list(data["UCs"])
+        self.uc_id = {uc: i for i, uc in enumerate(self.ucs)}
+        self.teachers = sorted(set(data["uc_to_teacher"].values()))
+        self.teacher_id = {t: i for i, t in enumerate(self.teachers)}
+        self.classes = sorted(set(data["uc_to_class"].values()))
+        self.class_id = {c: i for i, c in enumerate(self.classes)}
+        self.rooms = [POOL_ROOM, ONLINE_ROOM] + sorted(set(data["uc_room_required"].values()) | set(rooms))
+        self.room_id = {r: i for i, r in enumerate(self.rooms)}
+        self.R = len(self.rooms)
+
+        self.uc_teacher = array("i", (self.teacher_id[data["uc_to_teacher"][uc]] for uc in self.ucs))
+        self.uc_class = array("i", (self.class_id[data["uc_to_class"][uc]] for uc in self.ucs))
+        req = data["uc_room_required"]
+        self.uc_room = array("i", (self.room_id[req[uc]] if uc in req else -1 for uc in self.ucs))
+        online = data["uc_online_idx"]
+        self.uc_online = array("b", (sum(1 << i for i in online.get(uc, ())) for uc in self.ucs))
+        self.teacher_unavail = [frozenset(data["teacher_unavail"].get(t, ())) for t in self.teachers]
+        self.lesson_uc = {f"{uc}_{i}": uc for uc in self.ucs for i in (1, 2)}
+        self.base_rooms = tuple(sorted(rooms))
+        self._full = {}      # room_matching -> aulas com os domínios completos
+        self._layers = {}    # argumentos de layer() -> (aulas, pool_capacity)
+
+    # ---- Codificação ----
+    def encode(self, slot, room):
+        return slot * self.R + self.room_id[room]
+
+    def encode_value(self, lesson, val):
+        """(slot, sala, modo) -> valor codificado da aula (None se a sala não existir no modelo)."""
+        slot, room, _ = val
+        if lesson.online:
+            return slot * self.R + self.room_id[ONLINE_ROOM]
+        if not lesson.inperson:
+            return slot * self.R + self.room_id[POOL_ROOM]
+        r = self.room_id.get(room)
+        return None if r is None else slot * self.R + r
+
+    def fix(self, lesson, val):
+        """Cópia da aula só com o valor `val` no domínio (vazio se já não for possível)."""
+        v = self.encode_value(lesson, val)
+        domain = array("l", [v] if v is not None and v in lesson.domain else [])
+        return Lesson(lesson.id, lesson.uc, lesson.part, lesson.teacher, lesson.turma,
+                      lesson.online, domain, lesson.inperson, lesson.pool)
+
+    def _full_lessons(self, room_matching):
+        """Aulas com todas as salas base, todos os slots livres do docente e sem salas ocupadas."""
+        if room_matching in self._full:
+            return self._full[room_matching]
+        R = self.R
+        base = sorted(self.room_id[r] for r in self.base_rooms)
+        lessons = []
+        for u in range(len(self.ucs)):
+            bad = self.teacher_unavail[self.uc_teacher[u]]
+            valid = [s for s in self.slots if s not in bad]
+            for part in (1, 2):
+                online = bool(self.uc_online[u] >> part & 1)
+                if online:
+                    rooms = [self.room_id[ONLINE_ROOM]]
+                elif self.uc_room[u] >= 0:
+                    rooms = [self.uc_room[u]]
+                else:
+                    rooms = [self.room_id[POOL_ROOM]] if room_matching else base
+                domain = array("l", (s * R + r for s in valid for r in rooms))
+                lessons.append(Lesson(len(lessons), u, part, self.uc_teacher[u], self.uc_class[u],
+                                      online, domain, not online and rooms[0] != 0, False))
+        self._full[room_matching] = lessons
+        return lessons
+
+    def layer(self, base_rooms=("SalaA", "SalaB"), split_week=False, busy_rooms=(), room_matching=False):
+        """
+        Aulas de um nível (ver build_problem em main.py), por ordem de UC e parte:
+        os domínios completos filtrados pelas salas base do nível, pelo split da
+        semana e pelas salas ocupadas. Devolve (lessons, pool_capacity), com
+        pool_capacity = slot -> nº de salas base livres. O resultado fica em
+        cache e não deve ser alterado.
+        """
+        key = (tuple(base_rooms), split_week, frozenset(busy_rooms), room_matching)
+        if key in self._layers:
+            return self._layers[key]
+        if not set(base_rooms) <= set(self.base_rooms):
+            raise ValueError(f"salas base {sorted(set(base_rooms) - set(self.base_rooms))} fora do modelo "
+                             f"(Model(..., rooms={self.base_rooms}))")
+        R = self.R
+        base = {self.room_id[r] for r in base_rooms}
+        busy = {s * R + self.room_id[r] for (s, r) in busy_rooms if r in self.room_id}
+        pool_capacity = {s: sum(1 for r in base_rooms if (s, r) not in busy_rooms) for s in self.slots}
+        pivot = self.slots[len(self.slots) // 2 - 1]
+
+        lessons = []
+        for full in self._full_lessons(room_matching):
+            generic = not full.online and self.uc_room[full.uc] < 0
+            pooled = full.inperson is False and not full.online     # sala POOL_ROOM
+            first = full.part == 1
+            domain = array("l", (v for v in full.domain
+                                 if (not split_week or (v // R <= pivot) == first)
+                                 and (not generic or pooled or v % R in base)
+                                 and (pool_capacity[v // R] > 0 if pooled else v not in busy)))
+            req = self.uc_room[full.uc]
+            pool = room_matching and not full.online and (pooled or (req >= 0 and self.rooms[req] in base_rooms))
+            lessons.append(Lesson(full.id, full.uc, full.part, full.teacher, full.turma,
+                                  full.online, domain, full.inperson, pool))
+        self._layers[key] = (lessons, pool_capacity)
+        return lessons, pool_capacity
+
+    # ---- Descodificação ----
+    def name(self, lesson):
+        return f"{self.ucs[lesson.uc]}_{lesson.part}"
+
+    def value(self, lesson, v):
+        """Valor codificado -> (slot, sala, modo)."""
+        slot, room = divmod(v, self.R)
+        if lesson.online:
+            return (slot, f"Online::{self.ucs[lesson.uc]}", "online")
+        return (slot, self.rooms[room], "presencial")
+
+    def decode(self, lessons, values):
+        """{id da aula: valor codificado} -> {nome: (slot, sala, modo)}."""
+        return {self.name(lessons[i]): self.value(lessons[i], v) for i, v in values.items()}
+
+    def var_info(self, lesson):
+        """Dict da aula no formato de compute_var_infos/build_problem (python-constraint, LocalSearch)."""
+        domain = [self.value(lesson, v) for v in lesson.domain]
+        valid_slots = sorted({s for (s, _, _) in domain})
+        return {
+            "name": self.name(lesson),
+            "domain": domain,
+            "mode": "online" if lesson.online else "presencial",
+            "teacher": self.teachers[lesson.teacher],
+            "turma": self.classes[lesson.turma],
+            "inperson": lesson.inperson,
+            "pool": lesson.pool,
+            "valid_slots": valid_slots,
+            "valid_slots_only": set(valid_slots),
+            "rooms": sorted({r for (_, r, _) in domain}),
+        }
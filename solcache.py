@@ -0,0 +1,102 @@
+# solcache.py
+# Cache em disco das soluções por nível: a chave é o hash do dataset já lido
+# (load_dataset) com os kwargs do nível (os de build_problem) e o soft_max3.
+# Cada entrada guarda a melhor solução, o seu score_solution, by_class e se
+# ficou provado que é ótima (ou, sem solução, que o nível é inviável). Um
+# ficheiro JSON por entrada; acima de max_bytes saem as usadas há mais tempo.
+
+import hashlib, json, os, pathlib
+
+from dataset import CACHE_DIR
+
+CACHE_VERSION = 1   # mudar quando o formato das entradas ou o score mudarem
+
+
+def _canonical(obj):
+    # sets/frozensets (indisponibilidades, busy_rooms, ...) ordenados, para o hash não depender da ordem
+    return sorted(obj, key=repr)
+
+def solution_key(data, kwargs, soft_max3, slots=None):
+    """sha256 do dataset + kwargs do nível + soft_max3 (+ universo de slots)."""
+    payload = json.dumps([CACHE_VERSION, data, kwargs, soft_max3, slots],
+                         sort_keys=True, default=_canonical, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SolutionCache:
+    """
+    cache_dir: diretório das entradas (por omissão CACHE_DIR/solutions).
+    max_bytes: tamanho máximo total; ao passar, apagam-se as entradas menos
+               usadas recentemente (get atualiza o mtime).
+    Os erros de disco nunca interrompem a resolução: get devolve None e put não faz nada.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=64 << 20, slots=None):
+        self.dir = pathlib.Path(cache_dir or pathlib.Path(CACHE_DIR) / "solutions")
+        self.max_bytes = max_bytes
+        self.slots = list(slots) if slots is not None else None
+
+    def _file(self, data, kwargs, soft_max3):
+        return self.dir / f"{solution_key(data, kwargs, soft_max3, self.slots)}.json"
+
+    def get(self, data, kwargs, soft_max3):
+        """
+        Entrada do nível: dict com solution ({aula: (slot, sala, modo)} ou None),
+        score, by_class e optimal; None se não houver.
+        """
+        file = self._file(data, kwargs, soft_max3)
+        try:
+            entry = json.loads(file.read_text(encoding="utf-8"))
+            os.utime(file)
+        except (OSError, ValueError):
+            return None
+        if entry.get("version") != CACHE_VERSION:
+            return None
+        if entry["solution"] is not None:
+            entry["solution"] = {v: tuple(val) for v, val in entry["solution"].items()}
+        return entry
+
+    def put(self, data, kwargs, soft_max3, solution, score, by_class, optimal):
+        """
+        Guarda o resultado de um nível, a não ser que a entrada existente seja
+        melhor (score maior, ou o mesmo score já provado ótimo).
+        solution=None com optimal=True regista que o nível não tem solução.
+        """
+        old = self.get(data, kwargs, soft_max3)
+        if old is not None:
+            if old["solution"] is None and solution is None:
+                return
+            if old["solution"] is not None and (solution is None or (old["score"], old["optimal"]) >= (score, optimal)):
+                return
+        if solution is None and not optimal:
+            return
+        entry = {"version": CACHE_VERSION, "score": score, "optimal": optimal,
+                 "solution": solution, "by_class": by_class}
+        file = self._file(data, kwargs, soft_max3)
+        tmp = file.with_name(f"{file.name}.{os.getpid()}.tmp")
+        try:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, file)
+            self._evict()
+        except OSError:
+            tmp.unlink(missing_ok=True)
+
+    def _evict(self):
+        files = []
+        for f in self.dir.glob("*.json"):
+            try:
+                st = f.stat()
+            except OSError:
+                continue   # apagada por outro processo entretanto
+            files.append((st.st_mtime, st.st_size, f))
+        total = sum(size for _, size, _ in files)
+        for _, size, f in sorted(files, key=lambda x: x[0]):
+            if total <= self.max_bytes:
+                break
+            f.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for f in self.dir.glob("*.json"):
+            f.unlink(missing_ok=True)
@@ -0,0 +1,1167 @@
+# solver.py
+# Motor de pesquisa nativo para o modelo de horários (alternativa ao python-constraint).
+# A ocupação por docente, por turma e por (slot, sala) é mantida em bitmasks inteiras:
+# atribuir e desfazer um valor são operações de bits O(1), sem reconstruir listas/sets.
+# Os domínios vivos de cada variável são também bitmasks (bit k = valor k disponível),
+# com um trail para repor o estado ao recuar.
+
+import time
+from collections import defaultdict
+
+
+class Budget:
+    """
+    Orçamento cooperativo para a pesquisa: prazo monotónico (segundos, com fração)
+    e/ou número máximo de nós. A pesquisa chama tick() a cada nó e pára sozinha
+    quando o orçamento acaba, sem sinais nem exceções.
+    """
+
+    def __init__(self, seconds=None, max_nodes=None):
+        self.start = time.monotonic()
+        self.deadline = None if seconds is None else self.start + seconds
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.exhausted = False
+
+    def tick(self):
+        """Conta um nó; devolve False quando o orçamento se esgotou."""
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            self.exhausted = True
+        elif self.deadline is not None and time.monotonic() >= self.deadline:
+            self.exhausted = True
+        return not self.exhausted
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def remaining(self):
+        if self.deadline is None:
+            return float("inf")
+        return max(0.0, self.deadline - time.monotonic())
+
+
+class SearchStats:
+    """
+    Contadores de uma pesquisa: nós, recuos, verificações e domínios esvaziados
+    por família de restrições, tempo até à 1.ª solução e evolução do score.
+    """
+    FAMILIES = ("room", "teacher", "class", "max3", "online", "order")
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.nodes = 0
+        self.backtracks = 0
+        self.backjumps = 0        # recuos que saltaram pelo menos um nível (CBJ)
+        self.nogoods_learned = 0
+        self.nogood_prunes = 0    # valores retirados / ramos cortados por nogoods
+        self.checks = dict.fromkeys(self.FAMILIES, 0)
+        self.wipeouts = dict.fromkeys(self.FAMILIES, 0)
+        self.first_solution_s = None
+        self.solutions = 0
+        self.bound_prunes = 0     # subárvores cortadas pelo majorante (branch-and-bound)
+        self.score_history = []   # (segundos desde o início, melhor score)
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def on_solution(self):
+        self.solutions += 1
+        if self.first_solution_s is None:
+            self.first_solution_s = self.elapsed()
+
+    def on_score(self, score, at=None):
+        self.score_history.append((round(self.elapsed() if at is None else at, 4), score))
+
+    def to_dict(self):
+        return {
+            "nodes": self.nodes,
+            "backtracks": self.backtracks,
+            "backjumps": self.backjumps,
+            "nogoods_learned": self.nogoods_learned,
+            "nogood_prunes": self.nogood_prunes,
+            "checks": dict(self.checks),
+            "wipeouts": dict(self.wipeouts),
+            "first_solution_s": self.first_solution_s,
+            "solutions": self.solutions,
+            "bound_prunes": self.bound_prunes,
+            "elapsed": round(self.elapsed(), 4),
+            "score_history": list(self.score_history),
+        }
+
+
+class NogoodStore:
+    """
+    Nogoods pequenos aprendidos pelo BitsetSolver, partilháveis entre pesquisas
+    (recomeços) e entre os níveis de relaxação. Cada nogood é um conjunto de
+    atribuições (aula, valor) que não pode ocorrer todo junto, e guarda:
+      - as famílias de restrições usadas para o derivar;
+      - o contexto: os domínios das variáveis no nível em que foi aprendido.
+    Só é válido num modelo que tenha (pelo menos) essas famílias ativas, as
+    mesmas aulas e domínios contidos nos do contexto (mais restrito ou igual).
+    max_size: nº máximo de nogoods guardados (sai o mais antigo).
+    """
+
+    def __init__(self, max_size=5000, max_len=3):
+        self.max_size = max_size
+        self.max_len = max_len
+        self._contexts = []    # id -> {aula: frozenset(valores)}
+        self._entries = {}     # frozenset((aula, valor)) -> (frozenset(famílias), id do contexto)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def context(self, domains):
+        """Regista (ou reencontra) os domínios de um modelo; devolve o id do contexto."""
+        domains = {name: frozenset(vals) for name, vals in domains.items()}
+        for cid, ctx in enumerate(self._contexts):
+            if ctx == domains:
+                return cid
+        self._contexts.append(domains)
+        return len(self._contexts) - 1
+
+    def add(self, literals, families, cid):
+        key = frozenset(literals)
+        if key in self._entries:
+            return
+        if len(self._entries) >= self.max_size:
+            del self._entries[next(iter(self._entries))]
+        self._entries[key] = (frozenset(families), cid)
+
+    def usable(self, families, domains):
+        """Nogoods válidos num modelo com estas famílias ativas e estes domínios."""
+        families = set(families)
+        ok = {}
+        for cid, ctx in enumerate(self._contexts):
+            ok[cid] = all(name in domains and set(domains[name]) <= vals
+                          for name, vals in ctx.items())
+        for key, (fams, cid) in self._entries.items():
+            if ok[cid] and fams <= families:
+                yield key, fams
+
+
+def _max_matching(domains):
+    """Emparelhamento máximo variável -> slot (caminhos de aumento). Devolve (var->slot, slot->var)."""
+    var_to, slot_to = {}, {}
+
+    def augment(v, seen):
+        for s in domains[v]:
+            if s in seen:
+                continue
+            seen.add(s)
+            if s not in slot_to or augment(slot_to[s], seen):
+                var_to[v] = s
+                slot_to[s] = v
+                return True
+        return False
+
+    # as variáveis mais apertadas primeiro (encontra o emparelhamento com menos recuos)
+    for v in sorted(domains, key=lambda x: len(domains[x])):
+        augment(v, set())
+    return var_to, slot_to
+
+
+def assign_by_matching(domains):
+    """
+    domains: var -> conjunto de valores possíveis. Dá a cada var um valor
+    diferente (emparelhamento bipartido máximo); None se não houver.
+    """
+    var_to, _ = _max_matching(domains)
+    return var_to if len(var_to) == len(domains) else None
+
+
+def max_flow(capacity, source, sink):
+    """
+    Fluxo máximo (Edmonds-Karp) num grafo pequeno: capacity é (u, v) -> capacidade.
+    Devolve o valor do fluxo.
+    """
+    residual = defaultdict(int)
+    adj = defaultdict(set)
+    for (u, v), c in capacity.items():
+        residual[(u, v)] += c
+        adj[u].add(v)
+        adj[v].add(u)
+    flow = 0
+    while True:
+        parent, queue = {source: None}, [source]
+        for u in queue:
+            if u == sink:
+                break
+            for v in adj[u]:
+                if v not in parent and residual[(u, v)] > 0:
+                    parent[v] = u
+                    queue.append(v)
+        if sink not in parent:
+            return flow
+        path, v = [], sink
+        while parent[v] is not None:
+            path.append((parent[v], v))
+            v = parent[v]
+        push = min(residual[e] for e in path)
+        for u, v in path:
+            residual[(u, v)] -= push
+            residual[(v, u)] += push
+        flow += push
+
+
+def _hall_set(domains, slot_to, start):
+    """
+    Variáveis alcançáveis de `start` por caminhos alternados (var -> slot do
+    domínio -> var emparelhada com esse slot). Se o slot retirado pertence a
+    `start`, este conjunto ocupa todos os seus slots (conjunto de Hall) e é a
+    explicação da poda; se `start` ficou sem slot, tem menos slots do que aulas.
+    """
+    seen, stack = {start}, [start]
+    while stack:
+        for sl in domains[stack.pop()]:
+            w = slot_to.get(sl)
+            if w is not None and w not in seen:
+                seen.add(w)
+                stack.append(w)
+    return seen
+
+
+def alldiff_prune(domains):
+    """
+    AllDifferent sobre o slot (Régin): domains é var -> conjunto de slots possíveis.
+    Devolve var -> slots que não pertencem a nenhum emparelhamento completo
+    (podem ser retirados), ou None se não existir emparelhamento completo.
+    """
+    var_to, slot_to = _max_matching(domains)
+    if len(var_to) < len(domains):
+        return None
+
+    # Grafo orientado: var -> slot (arestas fora do emparelhamento), slot -> var (no emparelhamento)
+    succ = {}
+    for v, slots in domains.items():
+        succ[("v", v)] = [("s", s) for s in slots if s != var_to[v]]
+        for s in slots:
+            node = ("s", s)
+            if node not in succ:
+                succ[node] = [("v", slot_to[s])] if s in slot_to else []
+
+    # Nós que chegam a um slot livre (caminho alternado par): BFS no grafo inverso
+    pred = defaultdict(list)
+    for a, outs in succ.items():
+        for b in outs:
+            pred[b].append(a)
+    reach_free = {node for node in succ if node[0] == "s" and node[1] not in slot_to}
+    stack = list(reach_free)
+    while stack:
+        for a in pred[stack.pop()]:
+            if a not in reach_free:
+                reach_free.add(a)
+                stack.append(a)
+
+    # Componentes fortemente ligadas (Tarjan iterativo)
+    comp, low, index, on_stack, st = {}, {}, {}, set(), []
+    counter = 0
+    for root in succ:
+        if root in index:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, pos = work.pop()
+            if pos == 0:
+                index[node] = low[node] = counter
+                counter += 1
+                st.append(node)
+                on_stack.add(node)
+            outs = succ[node]
+            if pos < len(outs):
+                work.append((node, pos + 1))
+                nxt = outs[pos]
+                if nxt not in index:
+                    work.append((nxt, 0))
+                elif nxt in on_stack:
+                    low[node] = min(low[node], index[nxt])
+                continue
+            if low[node] == index[node]:
+                while True:
+                    x = st.pop()
+                    on_stack.discard(x)
+                    comp[x] = node
+                    if x == node:
+                        break
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+
+    removed = {}
+    for v, slots in domains.items():
+        bad = {s for s in slots
+               if s != var_to[v]
+               and comp[("v", v)] != comp[("s", s)]
+               and ("s", s) not in reach_free}
+        if bad:
+            removed[v] = bad
+    return removed
+
+
+
+class BitsetSolver:
+    """
+    Backend de pesquisa com a mesma interface usada de constraint.Problem
+    (getSolution / getSolutionIter), para poder ser devolvido por build_problem.
+    Com self.budget definido, a pesquisa termina (sem exceção) quando este se esgota.
+
+    lessons: lista de dicts com "name", "domain", "teacher", "turma", "inperson"
+             (ordem estática, p.ex. já ordenada por MRV em build_problem), ou de
+             registos Lesson (model.py) quando `model` é dado.
+    model:   Model de model.py; os domínios são então valores codificados
+             (slot*R + sala) e só se descodificam nas soluções e nos nogoods.
+    pairs:   pares (v1, v2) das duas aulas da mesma UC (quebra de simetria e online).
+    var_order: escolha da próxima variável
+             "static"  - ordem da lista `lessons`;
+             "dom"     - menor domínio vivo;
+             "domwdeg" - menor domínio / grau pesado (pesos sobem quando uma
+                         restrição esvazia um domínio).
+             Em "dom" e "domwdeg" o empate desfaz-se pelo grau dinâmico (aulas
+             livres do mesmo docente e da mesma turma).
+    val_order: ordem dos valores a tentar
+             "lex"   - slot crescente (como os domínios são construídos);
+             "lcv"   - least-constraining value: primeiro o valor que tira menos
+                       valores às aulas livres do mesmo docente/turma/sala;
+             "score" - pelo ganho no score_solution: dia diferente da outra aula
+                       da UC, encostado a aulas da turma, sem abrir um 5.º dia
+                       nem passar de 3 aulas no dia.
+    pool_capacity: slot -> nº de salas base livres. As aulas com "pool" no dict
+             ocupam uma sala do conjunto base sem a escolher (as salas concretas
+             são dadas depois por emparelhamento, ver assign_by_matching); em cada
+             slot não podem estar mais aulas "pool" do que a capacidade.
+    nogoods: NogoodStore opcional. A pesquisa regista porque é que cada valor
+             saiu de cada domínio (níveis e famílias responsáveis), recua
+             diretamente para a decisão culpada (conflict-directed backjumping)
+             e guarda os conflitos pequenos como nogoods, reaproveitados nas
+             pesquisas seguintes deste e de outros modelos compatíveis. Os
+             valores podados na raiz entram como nogoods de uma só aula e, nos
+             modelos onde são válidos, saem logo do domínio inicial.
+    hints:   aula -> valor (slot, sala, modo) para arranque a quente: o valor
+             dado (ou, se não existir, o 1.º com o mesmo slot) é o primeiro a
+             tentar. Se o orçamento acabar sem solução, self.partial fica com a
+             atribuição parcial em que a pesquisa parou.
+    """
+
+    VAR_ORDERS = ("static", "dom", "domwdeg")
+    VAL_ORDERS = ("lex", "lcv", "score")
+    _FAM_BIT = {f: 1 << n for n, f in enumerate(SearchStats.FAMILIES)}
+    _ALL_FAMS = (1 << len(SearchStats.FAMILIES)) - 1
+    _TAINT = 1 << len(SearchStats.FAMILIES)   # conflito que não é nogood (corte por score/enumeração)
+
+    def __init__(self, lessons, pairs, slot_day,
+                 rooms=True, max3=True, online_same_day=True, var_order="dom",
+                 val_order="lex", nogoods=None, pool_capacity=None, model=None, hints=None):
+        if var_order not in self.VAR_ORDERS:
+            raise ValueError(f"var_order desconhecido: {var_order!r} (usa um de {self.VAR_ORDERS})")
+        if val_order not in self.VAL_ORDERS:
+            raise ValueError(f"val_order desconhecido: {val_order!r} (usa um de {self.VAL_ORDERS})")
+        self.var_order = var_order
+        self.val_order = val_order
+        self.budget = None   # Budget opcional, verificado a cada nó
+        self.stats = SearchStats()
+        self.proven_optimal = False   # ver optimize()
+        self._best = None             # incumbente durante optimize(); None = sem corte
+        self.partial = None           # atribuição parcial quando o orçamento acaba sem solução
+        self.rooms = rooms
+        self.max3 = max3
+        self.online_same_day = online_same_day
+
+        self.model = model
+        self._lessons = lessons if model is not None else None
+        self.names = [model.name(l) for l in lessons] if model is not None else [vi["name"] for vi in lessons]
+        index = {name: i for i, name in enumerate(self.names)}
+
+        teacher_id, class_id, room_id, day_id = {}, {}, {}, {}
+        self._values = []    # valores originais: (slot, sala, modo) ou codificados (com model)
+        self._slot = []      # por variável: slot de cada valor
+        self._room = []      # por variável: id da sala de cada valor
+        self._day = []       # por variável: id do dia de cada valor
+        self._teacher = []
+        self._class = []
+        self._inperson = []
+        self._upto = []      # por variável: upto[s] = máscara dos valores com slot <= s
+        self._online = []    # por variável: máscara dos valores online
+        self._day_mask = []  # por variável: dia -> máscara dos valores nesse dia
+        self._pool = []
+        if model is not None:
+            R = model.R
+            max_slot = max((v // R for l in lessons for v in l.domain), default=0)
+        else:
+            max_slot = max((s for vi in lessons for (s, _, _) in vi["domain"]), default=0)
+        for vi in lessons:
+            if model is not None:
+                dom = vi.domain
+                self._slot.append([v // R for v in dom])
+                self._room.append([v % R for v in dom])
+                teacher, turma, inperson, pool = vi.teacher, vi.turma, vi.inperson, vi.pool
+                online = (1 << len(dom)) - 1 if vi.online else 0
+            else:
+                dom = list(vi["domain"])
+                self._slot.append([s for (s, _, _) in dom])
+                self._room.append([room_id.setdefault(r, len(room_id)) for (_, r, _) in dom])
+                teacher, turma, inperson, pool = vi["teacher"], vi["turma"], vi["inperson"], vi.get("pool", False)
+                online = sum(1 << k for k, (_, _, m) in enumerate(dom) if m == "online")
+            self._values.append(dom)
+            self._day.append([day_id.setdefault(slot_day(s), len(day_id)) for s in self._slot[-1]])
+            self._teacher.append(teacher_id.setdefault(teacher, len(teacher_id)))
+            self._class.append(class_id.setdefault(turma, len(class_id)))
+            self._inperson.append(inperson)
+            self._pool.append(pool)
+
+            upto, acc = [], 0
+            for s in range(max_slot + 1):
+                for k, sk in enumerate(self._slot[-1]):
+                    if sk == s:
+                        acc |= 1 << k
+                upto.append(acc)
+            self._upto.append(upto)
+            self._online.append(online)
+            day_mask = {}
+            for k, d in enumerate(self._day[-1]):
+                day_mask[d] = day_mask.get(d, 0) | (1 << k)
+            self._day_mask.append(day_mask)
+
+        # Tabela slot×sala -> aulas presenciais que a podem usar (e com que valores)
+        self._room_slot = {}
+        for i in range(len(lessons)):
+            if not self._inperson[i]:
+                continue
+            for k, (s, r) in enumerate(zip(self._slot[i], self._room[i])):
+                entries = self._room_slot.setdefault((r, s), {})
+                entries[i] = entries.get(i, 0) | (1 << k)
+        self._room_slot = {key: list(entries.items()) for key, entries in self._room_slot.items()}
+
+        # Grupos AllDifferent no slot: aulas do mesmo docente e da mesma turma
+        self._slot_vals = []   # por variável: slot -> máscara dos valores nesse slot
+        for slots in self._slot:
+            by_slot = {}
+            for k, sk in enumerate(slots):
+                by_slot[sk] = by_slot.get(sk, 0) | (1 << k)
+            self._slot_vals.append(by_slot)
+
+        # Salas base sem sala escolhida: slot -> aulas "pool" que o podem usar (e com que valores)
+        self._pool_cap = dict(pool_capacity or {})
+        self._pool_slot = defaultdict(list)
+        for i in range(len(lessons)):
+            if self._pool[i]:
+                for sk, mask in self._slot_vals[i].items():
+                    self._pool_slot[sk].append((i, mask))
+
+        groups = defaultdict(list)
+        for i in range(len(lessons)):
+            groups[("teacher", self._teacher[i])].append(i)
+            groups[("class", self._class[i])].append(i)
+        self._groups = list(groups.values())
+        self._group_family = [family for (family, _) in groups]
+        self._class_vars = [[] for _ in class_id]
+        for i, c in enumerate(self._class):
+            self._class_vars[c].append(i)
+        self._var_groups = [[] for _ in lessons]
+        for g, members in enumerate(self._groups):
+            for i in members:
+                self._var_groups[i].append(g)
+
+        # Pares da mesma UC: partner[i] = (j, i_é_a_primeira)
+        self._partner = [None] * len(self.names)
+        self._pair_of = [None] * len(self.names)
+        n_pairs = 0
+        for v1, v2 in pairs:
+            if v1 in index and v2 in index:
+                a, b = index[v1], index[v2]
+                self._partner[a] = (b, True)
+                self._partner[b] = (a, False)
+                self._pair_of[a] = self._pair_of[b] = n_pairs
+                n_pairs += 1
+
+        # Pesos para dom/wdeg: um por grupo (docente/turma, também usado pelo max3),
+        # um por par da mesma UC e um para a ocupação de salas. Persistem entre
+        # chamadas a getSolutionIter (o que se aprendeu numa pesquisa não se perde).
+        n_groups = len(self._groups)
+        self._class_group = [0] * len(class_id)
+        for g, (family, key) in enumerate(groups):
+            if family == "class":
+                self._class_group[key] = g
+        self._room_cid = n_groups + n_pairs
+        self._weights = [1] * (self._room_cid + 1)
+        self._var_cons = []
+        for i in range(len(lessons)):
+            cons = list(self._var_groups[i])
+            if self._pair_of[i] is not None:
+                cons.append(n_groups + self._pair_of[i])
+            if self._inperson[i] or self._pool[i]:
+                cons.append(self._room_cid)
+            self._var_cons.append(cons)
+
+        self._n_teachers = len(teacher_id)
+        self._n_classes = len(class_id)
+        self._n_rooms = model.R if model is not None else len(room_id)
+        self._n_days = len(day_id)
+        self._full = [(1 << len(dom)) - 1 for dom in self._values]
+        self._root = list(self._full)   # domínio inicial: _full sem os valores de nogoods unários
+        # dias por slot (para a ordenação por score: vizinhos só contam no mesmo dia)
+        self._slot_day_id = {}
+        for i in range(len(lessons)):
+            for sk, d in zip(self._slot[i], self._day[i]):
+                self._slot_day_id[sk] = d
+        # bit s ligado se os slots s e s+1 existem e são do mesmo dia (aulas consecutivas)
+        self._next_same_day = 0
+        for sk, d in self._slot_day_id.items():
+            if self._slot_day_id.get(sk + 1, -1) == d:
+                self._next_same_day |= 1 << sk
+        self._soft_max3 = False
+
+        # Nogoods: (variável, índice do valor) -> [(literais, famílias em bits)]
+        self.nogoods = nogoods
+        self._ng_by_lit = defaultdict(list)
+        self._ng_seen = set()
+        self._root_pruned = []     # (variável, valor, famílias) retirados por nogoods unários
+        self._families = {"teacher", "class", "order"}
+        if rooms:
+            self._families.add("room")
+        if max3:
+            self._families.add("max3")
+        if online_same_day:
+            self._families.add("online")
+        if nogoods is not None:
+            domains = {name: [self._value(i, k) for k in range(len(self._values[i]))]
+                       for i, name in enumerate(self.names)}
+            # a capacidade das salas base entra no contexto como um "domínio" (menos é mais restrito)
+            domains["#pool"] = [(sk, n) for sk, cap in self._pool_cap.items() for n in range(cap)]
+            self._ng_context = nogoods.context(domains)
+            value_index = [{val: k for k, val in enumerate(domains[name])} for name in self.names]
+            for key, fams in nogoods.usable(self._families, domains):
+                lits = []
+                for name, val in key:
+                    if name not in index:
+                        break
+                    i = index[name]
+                    if val not in value_index[i]:
+                        break           # literal impossível neste modelo: nogood vazio
+                    lits.append((i, value_index[i][val]))
+                else:
+                    fam = sum(self._FAM_BIT[f] for f in fams)
+                    if len(lits) == 1:
+                        # valor podado na raiz noutro modelo: sai já do domínio inicial
+                        i, k = lits[0]
+                        self._root[i] &= ~(1 << k)
+                        self._root_pruned.append((i, k, fam))
+                    self._add_nogood(tuple(sorted(lits)), fam)
+
+        self._hint = [-1] * len(self.names)
+        for i, name in enumerate(self.names):
+            want = (hints or {}).get(name)
+            if want is None:
+                continue
+            same_slot = -1
+            for k in range(len(self._values[i])):
+                val = self._value(i, k)
+                if val == want:
+                    self._hint[i] = k
+                    break
+                if same_slot < 0 and val[0] == want[0]:
+                    same_slot = k
+            else:
+                self._hint[i] = same_slot
+        self._reset()
+
+    # ---- Estado de ocupação e domínios ----
+    def _reset(self):
+        self._teacher_occ = [0] * self._n_teachers
+        self._class_occ = [0] * self._n_classes
+        self._room_occ = [0] * self._n_rooms           # bit s = sala ocupada no slot s
+        self._day_count = [[0] * self._n_days for _ in range(self._n_classes)]
+        self._pool_count = dict.fromkeys(self._pool_slot, 0)  # slot -> aulas "pool" atribuídas
+        self._assigned = [-1] * len(self.names)        # índice do valor atribuído (-1 = livre)
+        self._alive = list(self._root)
+        self._trail = []                               # (variável, máscara anterior)
+        self._free_in_group = [len(m) for m in self._groups]
+        # Explicações por valor retirado: níveis (bitmask de profundidades) e famílias
+        # responsáveis. Só contam enquanto o valor está morto, por isso não vão no trail.
+        self._val_dep = [[0] * len(dom) for dom in self._values]
+        self._val_fam = [[0] * len(dom) for dom in self._values]
+        self._depth_of = [0] * len(self.names)
+        self._fail = (0, 0)                            # explicação da última falha
+        for i, k, fam in self._root_pruned:
+            self._val_fam[i][k] = fam
+
+    def _prune(self, j, mask, dep=0, fam=0):
+        """
+        Retira os valores de `mask` ao domínio de j por causa dos níveis `dep` e
+        das famílias `fam`; False (e self._fail) se o domínio ficar vazio.
+        """
+        old = self._alive[j]
+        gone = old & mask
+        if gone:
+            self._trail.append((j, old))
+            self._alive[j] = old ^ gone
+            val_dep, val_fam = self._val_dep[j], self._val_fam[j]
+            while gone:
+                low = gone & -gone
+                gone ^= low
+                k = low.bit_length() - 1
+                val_dep[k] = dep
+                val_fam[k] = fam
+            if not self._alive[j]:
+                self._fail = self._explain(j)
+                return False
+        return True
+
+    def _undo_trail(self, mark):
+        trail, alive = self._trail, self._alive
+        while len(trail) > mark:
+            j, old = trail.pop()
+            alive[j] = old
+
+    def _explain(self, j, keep=None):
+        """Níveis e famílias que retiraram valores a j (só os de slot fora de `keep`)."""
+        dead = self._full[j] & ~self._alive[j]
+        val_dep, val_fam, slot_j = self._val_dep[j], self._val_fam[j], self._slot[j]
+        dep = fam = 0
+        while dead:
+            low = dead & -dead
+            dead ^= low
+            k = low.bit_length() - 1
+            if keep is None or slot_j[k] not in keep:
+                dep |= val_dep[k]
+                fam |= val_fam[k]
+        return dep, fam
+
+    def _group_reason(self, members, domains, fam):
+        """
+        Explicação de um conjunto de Hall: as atribuições dos membros e as podas
+        que os deixaram sem slots fora da união dos seus domínios.
+        """
+        keep = set()
+        for j in members:
+            keep |= domains[j]
+        dep = 0
+        for j in members:
+            if self._assigned[j] >= 0:
+                dep |= 1 << self._depth_of[j]
+            else:
+                d, f = self._explain(j, keep)
+                dep |= d
+                fam |= f
+        return dep, fam
+
+    def _consistent(self, i, k):
+        checks = self.stats.checks
+        bit = 1 << self._slot[i][k]
+        checks["teacher"] += 1
+        if self._teacher_occ[self._teacher[i]] & bit:
+            return False
+        checks["class"] += 1
+        if self._class_occ[self._class[i]] & bit:
+            return False
+        if self.rooms and self._inperson[i]:
+            checks["room"] += 1
+            if self._room_occ[self._room[i][k]] & bit:
+                return False
+        if self.rooms and self._pool[i]:
+            checks["room"] += 1
+            s = self._slot[i][k]
+            if self._pool_count[s] >= self._pool_cap.get(s, 0):
+                return False
+        if self.max3:
+            checks["max3"] += 1
+            if self._day_count[self._class[i]][self._day[i][k]] >= 3:
+                return False
+        return True
+
+    def _propagate(self, i, k):
+        if self.rooms and self._inperson[i] and not self._propagate_room(i, k):
+            return False
+        if self.rooms and self._pool[i] and not self._propagate_pool(i, k):
+            return False
+        if self.max3 and not self._propagate_max3(i, k):
+            return False
+        if not self._propagate_pair(i, k):
+            return False
+        if self._ng_by_lit and not self._propagate_nogoods(i, k):
+            return False
+        return self._propagate_alldiff(self._var_groups[i])
+
+    def _propagate_nogoods(self, i, k):
+        """Nogoods com i=k: falha se ficarem todos atribuídos, poda se faltar só um."""
+        assigned, alive, depth_of = self._assigned, self._alive, self._depth_of
+        for lits, fam in self._ng_by_lit.get((i, k), ()):
+            dep, free = 1 << depth_of[i], None
+            for v, kv in lits:
+                if v == i:
+                    continue
+                cur = assigned[v]
+                if cur == kv:
+                    dep |= 1 << depth_of[v]
+                elif cur >= 0 or free is not None or not (alive[v] >> kv) & 1:
+                    break           # já satisfeito ou ainda longe de disparar
+                else:
+                    free = (v, kv)
+            else:
+                self.stats.nogood_prunes += 1
+                if free is None:
+                    self._fail = (dep, fam)
+                    return False
+                if not self._prune(free[0], 1 << free[1], dep, fam):
+                    return False
+        return True
+
+    def _add_nogood(self, lits, fam):
+        if lits in self._ng_seen:
+            return
+        self._ng_seen.add(lits)
+        for lit in lits:
+            self._ng_by_lit[lit].append((lits, fam))
+
+    def _learn(self, order, dep, fam):
+        """Guarda como nogood as decisões dos níveis `dep` (se for pequeno e legítimo)."""
+        if fam & self._TAINT or not dep or dep.bit_count() > self._max_nogood():
+            return
+        lits = []
+        while dep:
+            low = dep & -dep
+            dep ^= low
+            v = order[low.bit_length() - 1]
+            lits.append((v, self._assigned[v]))
+        lits = tuple(sorted(lits))
+        if lits in self._ng_seen:
+            return
+        self._add_nogood(lits, fam)
+        self.stats.nogoods_learned += 1
+        if self.nogoods is not None:
+            families = [f for f, b in self._FAM_BIT.items() if fam & b]
+            self.nogoods.add([(self.names[v], self._value(v, kv)) for v, kv in lits],
+                             families, self._ng_context)
+
+    def _learn_root(self):
+        """Guarda no NogoodStore os valores podados na raiz (nogoods de uma só aula)."""
+        if self.nogoods is None:
+            return
+        for i, name in enumerate(self.names):
+            gone = self._root[i] & ~self._alive[i]
+            while gone:
+                low = gone & -gone
+                gone ^= low
+                k = low.bit_length() - 1
+                fam = self._val_fam[i][k]
+                if self._val_dep[i][k] or fam & self._TAINT:
+                    continue
+                families = [f for f, b in self._FAM_BIT.items() if fam & b]
+                self.nogoods.add([(name, self._value(i, k))], families, self._ng_context)
+
+    def _max_nogood(self):
+        return self.nogoods.max_len if self.nogoods is not None else 3
+
+    def _propagate_max3(self, i, k):
+        """Contador por turma/dia: ao chegar a 3, o dia sai das aulas livres da turma."""
+        c, d = self._class[i], self._day[i][k]
+        if self._day_count[c][d] < 3:
+            return True
+        self.stats.checks["max3"] += 1
+        dep = 0
+        for j in self._class_vars[c]:
+            kj = self._assigned[j]
+            if kj >= 0 and self._day[j][kj] == d:
+                dep |= 1 << self._depth_of[j]
+        fam = self._FAM_BIT["max3"]
+        for j in self._class_vars[c]:
+            if self._assigned[j] < 0 and not self._prune(j, self._day_mask[j].get(d, 0), dep, fam):
+                self.stats.wipeouts["max3"] += 1
+                self._weights[self._class_group[c]] += 1
+                return False
+        return True
+
+    def _propagate_room(self, i, k):
+        """Ocupação (slot, sala): retira o par agora ocupado às presenciais livres."""
+        assigned = self._assigned
+        self.stats.checks["room"] += 1
+        dep, fam = 1 << self._depth_of[i], self._FAM_BIT["room"]
+        for j, mask in self._room_slot[(self._room[i][k], self._slot[i][k])]:
+            if assigned[j] < 0 and not self._prune(j, mask, dep, fam):
+                self.stats.wipeouts["room"] += 1
+                self._weights[self._room_cid] += 1
+                return False
+        return True
+
+    def _propagate_pool(self, i, k):
+        """Capacidade das salas base: com o slot cheio, sai das aulas "pool" livres."""
+        s = self._slot[i][k]
+        if self._pool_count[s] < self._pool_cap.get(s, 0):
+            return True
+        assigned = self._assigned
+        self.stats.checks["room"] += 1
+        dep = 0
+        for j, _ in self._pool_slot[s]:
+            kj = assigned[j]
+            if kj >= 0 and self._slot[j][kj] == s:
+                dep |= 1 << self._depth_of[j]
+        for j, mask in self._pool_slot[s]:
+            if assigned[j] < 0 and not self._prune(j, mask, dep, self._FAM_BIT["room"]):
+                self.stats.wipeouts["room"] += 1
+                self._weights[self._room_cid] += 1
+                return False
+        return True
+
+    def _live_slots(self, j):
+        k = self._assigned[j]
+        if k >= 0:
+            return {self._slot[j][k]}
+        slots, m, slot_j = set(), self._alive[j], self._slot[j]
+        while m:
+            low = m & -m
+            slots.add(slot_j[low.bit_length() - 1])
+            m ^= low
+        return slots
+
+    def _propagate_alldiff(self, groups):
+        """
+        AllDifferent no slot por docente e por turma (emparelhamento, Régin).
+        Retira os slots que não cabem em nenhum emparelhamento completo e repete
+        nos grupos das aulas afetadas até não haver mais podas.
+        """
+        queue, queued = list(groups), set(groups)
+        while queue:
+            g = queue.pop()
+            queued.discard(g)
+            members = self._groups[g]
+            if sum(1 for j in members if self._assigned[j] < 0) == 0:
+                continue
+            family = self._group_family[g]
+            self.stats.checks[family] += 1
+            domains = {j: self._live_slots(j) for j in members}
+            removed = alldiff_prune(domains)
+            fam_bit = self._FAM_BIT[family]
+            if removed is None:
+                var_to, slot_to = _max_matching(domains)
+                lonely = next(j for j in members if j not in var_to)
+                self._fail = self._group_reason(_hall_set(domains, slot_to, lonely), domains, fam_bit)
+                self.stats.wipeouts[family] += 1
+                self._weights[g] += 1
+                return False
+            if removed:
+                var_to, slot_to = _max_matching(domains)
+                reasons = {}    # dono do slot no emparelhamento -> explicação do seu conjunto de Hall
+            for j, bad in removed.items():
+                by_slot = self._slot_vals[j]
+                mask, dep, fam = 0, 0, fam_bit
+                for sl in bad:
+                    mask |= by_slot[sl]
+                    owner = slot_to[sl]
+                    if owner not in reasons:
+                        reasons[owner] = self._group_reason(_hall_set(domains, slot_to, owner),
+                                                            domains, fam_bit)
+                    dep |= reasons[owner][0]
+                    fam |= reasons[owner][1]
+                if not self._prune(j, mask, dep, fam):
+                    self.stats.wipeouts[family] += 1
+                    self._weights[g] += 1
+                    return False
+                for h in self._var_groups[j]:
+                    if h != g and h not in queued:
+                        queued.add(h)
+                        queue.append(h)
+        return True
+
+    def _propagate_pair(self, i, k):
+        """Forward checking das restrições binárias do par da mesma UC."""
+        partner = self._partner[i]
+        if partner is None:
+            return True
+        j, first = partner
+        if self._assigned[j] >= 0:
+            return True
+        stats = self.stats
+        s = self._slot[i][k]
+        if first:
+            mask = self._upto[j][s]                          # _2 tem de ficar depois
+        else:
+            mask = self._full[j] & ~self._upto[j][s - 1]     # _1 tem de ficar antes
+        pair_cid = len(self._groups) + self._pair_of[i]
+        dep = 1 << self._depth_of[i]
+        stats.checks["order"] += 1
+        if not self._prune(j, mask, dep, self._FAM_BIT["order"]):
+            stats.wipeouts["order"] += 1
+            self._weights[pair_cid] += 1
+            return False
+        if self.online_same_day and (self._online[i] >> k) & 1:
+            stats.checks["online"] += 1
+            if not self._prune(j, self._online[j] & ~self._day_mask[j].get(self._day[i][k], 0),
+                               dep, self._FAM_BIT["online"]):
+                stats.wipeouts["online"] += 1
+                self._weights[pair_cid] += 1
+                return False
+        return True
+
+    def _assign(self, i, k, depth=0):
+        self._depth_of[i] = depth
+        bit = 1 << self._slot[i][k]
+        self._teacher_occ[self._teacher[i]] |= bit
+        self._class_occ[self._class[i]] |= bit
+        if self._inperson[i]:
+            self._room_occ[self._room[i][k]] |= bit
+        self._day_count[self._class[i]][self._day[i][k]] += 1
+        if self._pool[i]:
+            self._pool_count[self._slot[i][k]] += 1
+        self._assigned[i] = k
+        for g in self._var_groups[i]:
+            self._free_in_group[g] -= 1
+
+    def _unassign(self, i):
+        k = self._assigned[i]
+        bit = 1 << self._slot[i][k]
+        self._teacher_occ[self._teacher[i]] ^= bit
+        self._class_occ[self._class[i]] ^= bit
+        if self._inperson[i]:
+            self._room_occ[self._room[i][k]] ^= bit
+        self._day_count[self._class[i]][self._day[i][k]] -= 1
+        if self._pool[i]:
+            self._pool_count[self._slot[i][k]] -= 1
+        self._assigned[i] = -1
+        for g in self._var_groups[i]:
+            self._free_in_group[g] += 1
+
+    def _value(self, i, k):
+        """Valor k da variável i como tuplo (slot, sala, modo)."""
+        if self.model is None:
+            return self._values[i][k]
+        return self.model.value(self._lessons[i], self._values[i][k])
+
+    def _solution(self):
+        return {name: self._value(i, self._assigned[i]) for i, name in enumerate(self.names)}
+
+    def _degree(self, i):
+        """Grau dinâmico: aulas livres que partilham docente ou turma com i."""
+        return sum(self._free_in_group[g] for g in self._var_groups[i]) - len(self._var_groups[i])
+
+    def _wdeg(self, i):
+        return sum(self._weights[c] for c in self._var_cons[i])
+
+    def _select(self):
+        """Próxima variável segundo self.var_order (ver docstring da classe)."""
+        assigned, alive = self._assigned, self._alive
+        if self.var_order == "static":
+            for i, k in enumerate(assigned):
+                if k < 0:
+                    return i
+            return -1
+        use_wdeg = self.var_order == "domwdeg"
+        best, best_key = -1, None
+        for i, k in enumerate(assigned):
+            if k >= 0:
+                continue
+            size = alive[i].bit_count()
+            if size <= 1:
+                return i
+            key = (size / self._wdeg(i) if use_wdeg else size, -self._degree(i))
+            if best_key is None or key < best_key:
+                best, best_key = i, key
+        return best
+
+    # ---- Ordenação de valores ----
+    def _bits(self, mask):
+        out = []
+        while mask:
+            low = mask & -mask
+            out.append(low.bit_length() - 1)
+            mask ^= low
+        return out
+
+    def _lcv_cost(self, i, k):
+        """Quantos valores vivos este valor retira às aulas livres vizinhas."""
+        s, alive, assigned = self._slot[i][k], self._alive, self._assigned
+        cost, seen = 0, set()
+        for g in self._var_groups[i]:
+            for j in self._groups[g]:
+                if j != i and assigned[j] < 0 and j not in seen:
+                    seen.add(j)
+                    cost += (alive[j] & self._slot_vals[j].get(s, 0)).bit_count()
+        if self.rooms and self._inperson[i]:
+            for j, mask in self._room_slot[(self._room[i][k], s)]:
+                if j != i and assigned[j] < 0 and j not in seen:
+                    cost += (alive[j] & mask).bit_count()
+        return cost
+
+    def _score_gain(self, i, k):
+        """Ganho (otimista) no score_solution de pôr i=k, dado o estado atual."""
+        s, d, c = self._slot[i][k], self._day[i][k], self._class[i]
+        gain = 0
+        partner = self._partner[i]
+        if partner is not None:
+            kj = self._assigned[partner[0]]
+            if kj < 0 or self._day[partner[0]][kj] != d:
+                gain += 1
+        occ, day_of = self._class_occ[c], self._slot_day_id
+        if (occ >> (s - 1)) & 1 and day_of.get(s - 1) == d:
+            gain += 1
+        if (occ >> (s + 1)) & 1 and day_of.get(s + 1) == d:
+            gain += 1
+        counts = self._day_count[c]
+        if counts[d] == 0 and sum(1 for x in counts if x) >= 4:
+            gain -= 2
+        if counts[d] >= 3:
+            gain -= 1
+        return gain
+
+    def _ordered_values(self, i):
+        """Valores vivos de i, do último para o primeiro a tentar (consumidos com pop())."""
+        ks = self._bits(self._alive[i])
+        if self.val_order == "lcv":
+            ks.sort(key=lambda k: self._lcv_cost(i, k))
+        elif self.val_order == "score":
+            ks.sort(key=lambda k: -self._score_gain(i, k))
+        ks.reverse()
+        hint = self._hint[i]
+        if hint >= 0 and (self._alive[i] >> hint) & 1:
+            ks.remove(hint)
+            ks.append(hint)
+        return ks
+
+    # ---- Majorante do score (branch-and-bound) ----
+    def _upper_bound(self):
+        """
+        Majorante otimista de score_solution para a atribuição parcial atual;
+        numa atribuição completa coincide com o score exato.
+          1) UC em dias distintos: +1 se ainda possível (outra aula livre com
+             valores vivos noutro dia);
+          2) consecutivas: cada aula livre junta no máximo 2 pares, e uma turma
+             com n aulas em D dias nunca tem mais de n - D pares;
+          3) dias acima de 4: D nunca desce dos dias já usados (nem de ceil(n/3)
+             com max3 hard);
+          4) excesso do max3 soft: só pode crescer.
+        """
+        assigned, alive, day, day_mask = self._assigned, self._alive, self._day, self._day_mask
+        ub = 0
+        for i, partner in enumerate(self._partner):
+            if partner is None or not partner[1]:
+                continue
+            j = partner[0]
+            ki, kj = assigned[i], assigned[j]
+            if ki >= 0 and kj >= 0:
+                ub += day[i][ki] != day[j][kj]
+            elif ki >= 0:
+                ub += (alive[j] & ~day_mask[j].get(day[i][ki], 0)) != 0
+            elif kj >= 0:
+                ub += (alive[i] & ~day_mask[i].get(day[j][kj], 0)) != 0
+            else:
+                ub += 1
+        for c, members in enumerate(self._class_vars):
+            occ, counts = self._class_occ[c], self._day_count[c]
+            n = len(members)
+            free = sum(1 for i in members if assigned[i] < 0)
+            adj = (occ & (occ >> 1) & self._next_same_day).bit_count()
+            days = max(sum(1 for x in counts if x), 1 if n else 0)
+            if self.max3:
+                days = max(days, -(-n // 3))
+            ub += min(adj + 2 * free, n - days) - 2 * max(0, days - 4)
+            if self._soft_max3:
+                ub -= sum(x - 3 for x in counts if x > 3)
+        return ub
+
+    def optimize(self, soft_max3=False, floor=None):
+        """
+        Branch-and-bound sobre score_solution: gera (solução, score) cada vez
+        melhores, cortando os ramos cujo majorante não bate o incumbente.
+        floor: score de uma solução já conhecida (só procura melhores).
+        No fim, self.proven_optimal diz se a pesquisa acabou dentro do orçamento,
+        i.e. se a última solução gerada (ou o floor) é ótima.
+        """
+        self._soft_max3 = soft_max3
+        self._best = float("-inf") if floor is None else floor
+        self.proven_optimal = False
+        try:
+            for sol in self.getSolutionIter():
+                self._best = self._upper_bound()
+                yield sol, self._best
+            self.proven_optimal = self.budget is None or not self.budget.exhausted
+        finally:
+            self._best = None
+
+    def tighten(self, score):
+        """Sobe o incumbente de um optimize() em curso (p.ex. com um score de pesquisa local)."""
+        if self._best is not None and score > self._best:
+            self._best = score
+
+    # ---- Pesquisa (backtracking iterativo com backjumping, sem recursão) ----
+    def getSolutionIter(self):
+        self._reset()
+        budget, stats = self.budget, self.stats
+        n = len(self.names)
+        if n == 0:
+            yield {}
+            return
+        order = [0] * n     # variável escolhida em cada profundidade
+        pending = [None] * n  # valores ainda por tentar em cada profundidade (pilha)
+        marks = [0] * n     # tamanho do trail antes de atribuir em cada profundidade
+        conf = [0] * n      # conjunto de conflito: profundidades culpadas (bitmask)
+        conf_fam = [0] * n  # ... e famílias de restrições envolvidas
+        if not self._propagate_alldiff(range(len(self._groups))):
+            return
+        self._learn_root()
+        i = order[0] = self._select()
+        pending[0] = self._ordered_values(i)
+        conf[0], conf_fam[0] = self._explain(i)
+        depth = 0
+        while depth >= 0:
+            i = order[depth]
+            if self._assigned[i] >= 0:
+                self._unassign(i)
+                self._undo_trail(marks[depth])
+            placed = False
+            below = (1 << depth) - 1
+            while pending[depth]:
+                if budget is not None and not budget.tick():
+                    if not stats.solutions:
+                        self.partial = {self.names[v]: self._value(v, self._assigned[v])
+                                        for v in order[:depth] if self._assigned[v] >= 0}
+                    return
+                stats.nodes += 1
+                k = pending[depth].pop()
+                if not self._consistent(i, k):
+                    conf[depth] |= below            # sem explicação fina: todos os anteriores
+                    conf_fam[depth] |= self._ALL_FAMS
+                    continue
+                marks[depth] = len(self._trail)
+                self._assign(i, k, depth)
+                if self._propagate(i, k):
+                    if self._best is None or self._upper_bound() > self._best:
+                        placed = True
+                        break
+                    stats.bound_prunes += 1
+                    self._fail = (below, self._TAINT)
+                dep, fam = self._fail
+                conf[depth] |= dep & below
+                conf_fam[depth] |= fam
+                self._unassign(i)
+                self._undo_trail(marks[depth])
+            if not placed:
+                # sem valores: salta para o nível culpado mais recente
+                stats.backtracks += 1
+                self._learn(order, conf[depth], conf_fam[depth])
+                if not conf[depth]:
+                    return
+                h = conf[depth].bit_length() - 1
+                conf[h] |= conf[depth] & ~(1 << h)
+                conf_fam[h] |= conf_fam[depth]
+                if h < depth - 1:
+                    stats.backjumps += 1
+                    for t in range(depth - 1, h, -1):
+                        self._unassign(order[t])
+                    self._undo_trail(marks[h + 1])
+                depth = h
+                continue
+            if depth == n - 1:
+                stats.on_solution()
+                yield self._solution()
+                # a seguir, recuo cronológico: o que vier abaixo já não é conflito
+                for t in range(n):
+                    conf[t] = (1 << t) - 1
+                    conf_fam[t] |= self._TAINT
+                continue
+            depth += 1
+            i = order[depth] = self._select()
+            pending[depth] = self._ordered_values(i)
+            conf[depth], conf_fam[depth] = self._explain(i)
+
+    def getSolution(self):
+        for sol in self.getSolutionIter():
+            return sol
+        return None
@@ -0,0 +1,40 @@
+# Datasets pequenos (mesmo formato de load_dataset) para os testes.
+
+import pathlib, random, sys
+from collections import defaultdict
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+
+def make_dataset(class_to_ucs, uc_to_teacher, teacher_unavail=None, uc_room_required=None, uc_online_idx=None):
+    """Dataset a partir de turma -> UCs e UC -> docente (o resto é opcional)."""
+    teacher_to_ucs = defaultdict(list)
+    for uc, t in uc_to_teacher.items():
+        teacher_to_ucs[t].append(uc)
+    uc_to_class = {uc: c for c, ucs in class_to_ucs.items() for uc in ucs}
+    return {
+        "class_to_ucs": dict(class_to_ucs),
+        "teacher_to_ucs": dict(teacher_to_ucs),
+        "teacher_unavail": {t: set(s) for t, s in (teacher_unavail or {}).items()},
+        "uc_room_required": dict(uc_room_required or {}),
+        "uc_online_idx": defaultdict(set, {uc: set(i) for uc, i in (uc_online_idx or {}).items()}),
+        "uc_to_class": uc_to_class,
+        "uc_to_teacher": dict(uc_to_teacher),
+        "UCs": sorted(uc_to_class),
+    }
+
+def small_dataset(seed, free=(4, 5, 6)):
+    """2 turmas de 2-3 UCs, um docente por turma com `free` slots livres, Lab01 e online ao acaso."""
+    rng = random.Random(seed)
+    class_to_ucs, uc_to_teacher, unavail, rooms, online = {}, {}, {}, {}, {}
+    for c in range(2):
+        ucs = [f"U{c}{j}" for j in range(rng.choice((2, 3)))]
+        class_to_ucs[f"t{c}"] = ucs
+        unavail[f"p{c}"] = set(range(1, 21)) - set(rng.sample(range(1, 21), rng.choice(free)))
+        for uc in ucs:
+            uc_to_teacher[uc] = f"p{c}"
+            if rng.random() < 0.5:
+                rooms[uc] = "Lab01"
+        if rng.random() < 0.5:
+            online[ucs[0]] = {2}
+    return make_dataset(class_to_ucs, uc_to_teacher, unavail, rooms, online)
@@ -0,0 +1,34 @@
+import itertools
+
+import pytest
+from constraint import BacktrackingSolver
+
+from conftest import small_dataset
+from main import LAYERS, build_problem
+
+CAP = 3000   # acima disto, só se verifica que ambos passam do limite
+
+
+def solution_set(problem):
+    sols = list(itertools.islice(problem.getSolutionIter(), CAP + 1))
+    return None if len(sols) > CAP else sorted(sorted(s.items()) for s in sols)
+
+@pytest.mark.parametrize("seed", (1, 2, 3, 4, 6, 10))
+@pytest.mark.parametrize("layer", range(len(LAYERS)))
+def test_constraint_and_bitset_agree(seed, layer):
+    data = small_dataset(seed)
+    kwargs = LAYERS[layer][1]
+    a, by_class_a, _ = build_problem(data, backend="constraint", **kwargs)
+    b, by_class_b, _ = build_problem(data, backend="bitset", **kwargs)
+    assert (a is None) == (b is None)
+    if a is None:
+        return
+    assert {c: sorted(vs) for c, vs in by_class_a.items()} == {c: sorted(vs) for c, vs in by_class_b.items()}
+    assert solution_set(a) == solution_set(b)
+
+def test_incremental_constraints_reject_a_stock_solver():
+    problem, _, _ = build_problem(small_dataset(2), backend="constraint", **LAYERS[0][1])
+    assert problem.getSolution() is not None
+    problem.setSolver(BacktrackingSolver())
+    with pytest.raises(RuntimeError):
+        problem.getSolution()
@@ -0,0 +1,23 @@
+import pytest
+
+from conftest import small_dataset
+from main import LAYERS, build_problem, score_solution
+
+
+@pytest.mark.parametrize("seed", (1, 2, 3, 4, 6, 10))
+@pytest.mark.parametrize("layer", range(len(LAYERS) - 1))   # o nível TESTE tem soluções demais
+def test_bnb_optimum_matches_enumeration(seed, layer):
+    data = small_dataset(seed)
+    _, kwargs, soft_max3 = LAYERS[layer]
+    problem, by_class, _ = build_problem(data, backend="bitset", **kwargs)
+    if problem is None:
+        return
+    scores = [score_solution(s, by_class, data, soft_max3=soft_max3) for s in problem.getSolutionIter()]
+
+    problem, by_class, _ = build_problem(data, backend="bitset", **kwargs)
+    last = None
+    for sol, score in problem.optimize(soft_max3=soft_max3):
+        assert score == score_solution(sol, by_class, data, soft_max3=soft_max3)
+        last = score
+    assert problem.proven_optimal
+    assert last == (max(scores) if scores else None)
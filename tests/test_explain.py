@@ -0,0 +1,28 @@
+from conftest import make_dataset
+from main import LAYERS, constraint_groups, explain_infeasibility, groups_consistent, precheck_layer
+
+
+def test_fixed_base_room_overbooked():
+    # 11 UCs (22 aulas) presas à SalaA, que é sala base: só há 20 slots
+    ucs = [f"U{i:02d}" for i in range(11)]
+    data = make_dataset({f"t{i}": [uc] for i, uc in enumerate(ucs)},
+                        {uc: f"p{i}" for i, uc in enumerate(ucs)},
+                        uc_room_required={uc: "SalaA" for uc in ucs})
+    kwargs = LAYERS[0][1]
+    assert precheck_layer(data, kwargs)
+    assert groups_consistent(data, kwargs, constraint_groups(data, kwargs)) is False
+    assert explain_infeasibility(data, kwargs, seconds=5.0) == [("room", "SalaA")]
+
+def test_fixed_base_room_counts_in_base_capacity():
+    # 10 UCs na SalaA enchem os 20 slots; no nível de 1 sala base, uma UC a mais
+    # (sem sala fixa) já não cabe na capacidade das salas base
+    ucs = [f"U{i:02d}" for i in range(10)]
+    data = make_dataset({f"t{i}": [uc] for i, uc in enumerate(ucs)},
+                        {uc: f"p{i}" for i, uc in enumerate(ucs)},
+                        uc_room_required={uc: "SalaA" for uc in ucs})
+    assert groups_consistent(data, LAYERS[2][1], constraint_groups(data, LAYERS[2][1])) is True
+    data = make_dataset(dict(data["class_to_ucs"], tx=["X"]), dict(data["uc_to_teacher"], X="px"),
+                        uc_room_required=data["uc_room_required"])
+    kwargs = LAYERS[2][1]
+    assert groups_consistent(data, kwargs, constraint_groups(data, kwargs)) is False
+    assert groups_consistent(data, kwargs, set(constraint_groups(data, kwargs)) - {("base",)}) is True
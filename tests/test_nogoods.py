@@ -0,0 +1,43 @@
+import itertools
+
+import pytest
+
+from conftest import small_dataset
+from main import LAYERS, CompiledModel, build_problem
+
+CAP = 3000
+
+
+def solution_set(problem):
+    sols = list(itertools.islice(problem.getSolutionIter(), CAP + 1))
+    return None if len(sols) > CAP else sorted(sorted(s.items()) for s in sols)
+
+def best_score(problem):
+    last = None
+    for _, score in problem.optimize():
+        last = score
+    return last
+
+@pytest.mark.parametrize("seed", (1, 2, 3, 4, 6, 10))
+def test_shared_nogoods_keep_every_solution(seed):
+    # os nogoods, os valores podados na raiz e o arranque a quente passam de nível
+    # para nível (e voltam aos primeiros): nenhum pode tirar uma solução real
+    data = small_dataset(seed)
+    compiled = CompiledModel(data)
+    for layer in list(range(len(LAYERS) - 1)) + [0, 2, 1]:
+        kwargs = LAYERS[layer][1]
+        fresh, _, _ = build_problem(data, backend="bitset", **kwargs)
+        shared, _, _ = build_problem(data, backend="bitset", compiled=compiled, nogoods=compiled.nogoods, **kwargs)
+        assert (fresh is None) == (shared is None)
+        if fresh is None:
+            continue
+        expected = solution_set(fresh)
+        assert solution_set(shared) == expected
+        if expected:
+            compiled.remember(dict(expected[len(expected) // 2]))
+        elif shared.partial:
+            compiled.remember(shared.partial)
+
+        fresh, _, _ = build_problem(data, backend="bitset", **kwargs)
+        shared, _, _ = build_problem(data, backend="bitset", compiled=compiled, nogoods=compiled.nogoods, **kwargs)
+        assert best_score(shared) == best_score(fresh)
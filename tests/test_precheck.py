@@ -0,0 +1,16 @@
+import pytest
+
+from conftest import small_dataset
+from main import LAYERS, build_problem, precheck_layer
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_precheck_never_rejects_a_feasible_layer(seed):
+    data = small_dataset(seed, free=(3, 4, 5, 6))
+    for _, kwargs, _ in LAYERS:
+        for busy in ((), {(s, "SalaA") for s in range(1, 21, 2)}):
+            kw = dict(kwargs, busy_rooms=busy)
+            reasons = precheck_layer(data, kw)
+            if reasons:
+                problem, _, _ = build_problem(data, backend="bitset", **kw)
+                assert problem is None or problem.getSolution() is None, reasons
@@ -0,0 +1,20 @@
+import copy, pathlib
+
+from dataset import load_dataset
+from main import DATA_PATH, LAYERS, build_problem, repair_solution, still_valid
+
+DATA = load_dataset(pathlib.Path(__file__).resolve().parent.parent / DATA_PATH, cache=False)
+KWARGS = dict(LAYERS[0][1], room_matching=False)
+
+
+def test_repair_after_new_unavailability():
+    prev = build_problem(DATA, backend="bitset", **KWARGS)[0].getSolution()
+    for lesson, (slot, _, _) in sorted(prev.items()):
+        data = copy.deepcopy(DATA)
+        teacher = data["uc_to_teacher"][lesson.rsplit("_", 1)[0]]
+        data["teacher_unavail"][teacher] = set(data["teacher_unavail"].get(teacher, ())) | {slot}
+        sol, _, changed = repair_solution(prev, data, seconds=5.0, kwargs=KWARGS)
+        assert sol is not None
+        kept, broken = still_valid(sol, data, KWARGS)
+        assert not broken and len(kept) == len(prev)
+        assert lesson in changed and len(changed) <= 4, changed
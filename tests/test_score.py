@@ -0,0 +1,50 @@
+import pathlib, random
+
+import pytest
+
+from dataset import load_dataset
+from main import DATA_PATH, SLOTS, DeltaScorer, score_solution, slot_day
+
+DATA = load_dataset(pathlib.Path(__file__).resolve().parent.parent / DATA_PATH, cache=False)
+BY_CLASS = {c: [f"{uc}_{i}" for uc in ucs for i in (1, 2)] for c, ucs in DATA["class_to_ucs"].items()}
+
+
+def random_solution(rng):
+    # slots distintos dentro de cada turma, como numa solução das hard constraints
+    sol = {}
+    for tvars in BY_CLASS.values():
+        for v, s in zip(tvars, rng.sample(SLOTS, len(tvars))):
+            sol[v] = (s, "SalaA", "presencial")
+    return sol
+
+def random_move(sol, rng):
+    # uma aula para um slot livre da turma, ou troca de slots entre duas aulas da mesma turma
+    tvars = rng.choice(list(BY_CLASS.values()))
+    a, b = rng.sample(tvars, 2)
+    if rng.random() < 0.5:
+        return {a: sol[b], b: sol[a]}
+    free = sorted(set(SLOTS) - {sol[v][0] for v in tvars})
+    return {a: (rng.choice(free), "SalaA", "presencial")}
+
+@pytest.mark.parametrize("soft_max3", (True, False))
+def test_delta_scorer_matches_score_solution(soft_max3):
+    rng = random.Random(1)
+    sol = random_solution(rng)
+    scorer = DeltaScorer(sol, BY_CLASS, DATA, soft_max3=soft_max3)
+    assert scorer.score == score_solution(sol, BY_CLASS, DATA, soft_max3=soft_max3)
+    for _ in range(2000):
+        changes = random_move(sol, rng)
+        sol.update(changes)
+        assert scorer.update(changes) == score_solution(sol, BY_CLASS, DATA, soft_max3=soft_max3)
+    for _ in range(200):
+        sol = random_solution(rng)
+        assert scorer.rescore(sol) == score_solution(sol, BY_CLASS, DATA, soft_max3=soft_max3)
+
+@pytest.mark.parametrize("soft_max3", (True, False))
+def test_batch_scorer_matches_score_solution(soft_max3):
+    batchscore = pytest.importorskip("batchscore")
+    rng = random.Random(2)
+    sols = [random_solution(rng) for _ in range(500)]
+    scorer = batchscore.BatchScorer(BY_CLASS, DATA, slot_day, SLOTS)
+    assert list(scorer.score_solutions(sols, soft_max3=soft_max3)) == \
+        [score_solution(s, BY_CLASS, DATA, soft_max3=soft_max3) for s in sols]
@@ -0,0 +1,56 @@
+import os
+
+from conftest import make_dataset
+from solcache import SolutionCache
+
+DATA = make_dataset({"t0": ["A", "B"]}, {"A": "p0", "B": "p0"}, teacher_unavail={"p0": {1, 2, 3}},
+                    uc_online_idx={"B": {2}})
+KWARGS = {"base_rooms": ("SalaA",), "busy_rooms": {(1, "SalaA"), (2, "SalaA")}}
+SOL = {"A_1": (4, "SalaA", "presencial"), "A_2": (5, "SalaA", "presencial"),
+       "B_1": (6, "SalaA", "presencial"), "B_2": (7, "Online::B", "online")}
+BY_CLASS = {"t0": ["A_1", "A_2", "B_1", "B_2"]}
+
+
+def test_round_trip(tmp_path):
+    cache = SolutionCache(tmp_path)
+    assert cache.get(DATA, KWARGS, False) is None
+    cache.put(DATA, KWARGS, False, SOL, 3, BY_CLASS, False)
+    entry = cache.get(DATA, KWARGS, False)
+    assert (entry["solution"], entry["score"], entry["by_class"], entry["optimal"]) == (SOL, 3, BY_CLASS, False)
+    # os sets entram na chave ordenados: a mesma chave com outra ordem de inserção
+    assert cache.get(DATA, dict(KWARGS, busy_rooms={(2, "SalaA"), (1, "SalaA")}), False) is not None
+    assert cache.get(DATA, KWARGS, True) is None
+    assert cache.get(DATA, dict(KWARGS, base_rooms=("SalaA", "SalaB")), False) is None
+
+def test_keeps_the_better_entry(tmp_path):
+    cache = SolutionCache(tmp_path)
+    cache.put(DATA, KWARGS, False, SOL, 3, BY_CLASS, False)
+    cache.put(DATA, KWARGS, False, SOL, 2, BY_CLASS, False)
+    cache.put(DATA, KWARGS, False, None, None, None, True)
+    assert cache.get(DATA, KWARGS, False)["score"] == 3
+    cache.put(DATA, KWARGS, False, SOL, 3, BY_CLASS, True)
+    assert cache.get(DATA, KWARGS, False)["optimal"] is True
+
+def test_infeasible_layer(tmp_path):
+    cache = SolutionCache(tmp_path)
+    cache.put(DATA, KWARGS, False, None, None, None, False)   # sem solução nem prova: não guarda
+    assert cache.get(DATA, KWARGS, False) is None
+    cache.put(DATA, KWARGS, False, None, None, None, True)
+    entry = cache.get(DATA, KWARGS, False)
+    assert entry["solution"] is None and entry["optimal"] is True
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = SolutionCache(tmp_path)
+    layers = [dict(KWARGS, split_week=i) for i in range(3)]
+    for i, kwargs in enumerate(layers):
+        cache.put(DATA, kwargs, False, SOL, i, BY_CLASS, False)
+    files = {f: f.stat().st_size for f in tmp_path.glob("*.json")}
+    assert len(files) == 3
+    for t, kwargs in zip((100, 300, 200), layers):
+        os.utime(cache._file(DATA, kwargs, False), (t, t))
+    # o limite só deixa ficar duas entradas: sai a usada há mais tempo (a 1.ª)
+    cache.max_bytes = sum(sorted(files.values())[-2:])
+    cache.put(DATA, dict(KWARGS, split_week=9), False, SOL, 0, BY_CLASS, False)
+    assert cache.get(DATA, layers[0], False) is None
+    assert cache.get(DATA, layers[1], False) is not None
+    assert sum(1 for _ in tmp_path.glob("*.json")) == 2